@@ -0,0 +1,64 @@
+"""
+C -> python callback rate of @s.share functions called in a C loop.
+
+    python benchmarks/callbacks.py [--count N]
+"""
+import argparse
+from timeit import repeat
+
+from cexi import Module, s
+
+
+class Callbacks(Module):
+
+    class options:
+        flags = ['-O2']
+
+    @s.share
+    def one(self, x: int) -> int:
+        return x
+
+    @s.share
+    def two(self, x: int, y: 'double') -> ('double', int):
+        return y, x
+
+    @s.py
+    def drive_one(n: int) -> int:
+        """
+        int acc = 0, r;
+        for (int i = 0; i < n; i++) {
+            if (one(i, &r))
+                return -1;
+            acc += r;
+        }
+        return acc;
+        """
+
+    @s.py
+    def drive_two(n: int) -> int:
+        """
+        int acc = 0, r;
+        double d;
+        for (int i = 0; i < n; i++) {
+            if (two(i, 0.5, &d, &r))
+                return -1;
+            acc += r;
+        }
+        return acc;
+        """
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=200_000)
+    args = parser.parse_args()
+
+    c = Callbacks()
+    print(f'{"callback":<10}{"callbacks/s":>16}')
+    for name, drive in (('one', c.drive_one), ('two', c.drive_two)):
+        seconds = min(repeat(lambda: drive(args.count), number=1, repeat=5))
+        print(f'{name:<10}{args.count / seconds:>16,.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Calls per second of @s.py functions, through a module instance & directly.
+
+    python benchmarks/calls.py [--number N]
+"""
+import argparse
+from timeit import repeat
+
+from cexi import Module, s
+
+
+class Calls(Module):
+
+    class options:
+        flags = ['-O2']
+
+    @s.py
+    def noargs() -> int:
+        """
+        return 1;
+        """
+
+    @s.py
+    def one(x: int) -> int:
+        """
+        return x + 1;
+        """
+
+    @s.py
+    def two(x: int, y: 'double') -> 'double':
+        """
+        return x + y;
+        """
+
+    @s.py
+    def three(x: int, y: int, z: int) -> int:
+        """
+        return x + y + z;
+        """
+
+
+CASES = (
+    ('noargs', ()),
+    ('one', (1,)),
+    ('two', (1, 2.0)),
+    ('three', (1, 2, 3)),
+)
+
+
+def rate(f, args, number):
+    best = min(repeat(lambda: f(*args), number=number, repeat=5))
+    return number / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=200_000)
+    args = parser.parse_args()
+
+    calls = Calls()
+    raw = Calls.cexi_module.module
+    print(f'{"function":<10}{"instance calls/s":>18}{"direct calls/s":>16}')
+    for name, params in CASES:
+        bound = rate(getattr(calls, name), params, args.number)
+        direct = rate(getattr(raw, name), params, args.number)
+        print(f'{name:<10}{bound:>18,.0f}{direct:>16,.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Class creation & code generation time of a module with many functions.
+
+    python benchmarks/codegen.py [--functions N]
+"""
+import argparse
+from time import perf_counter
+
+from cexi import Module, s
+
+
+def source(functions):
+    lines = ['class Generated(Module):']
+    for i in range(functions):
+        lines += [
+            '    @s.py',
+            f'    def f{i}(x: int, y: "double") -> "double":',
+            f'        "return x * y + {i};"',
+        ]
+    return '\n'.join(lines)
+
+
+def define(code):
+    namespace = {'Module': Module, 's': s}
+    exec(code, namespace)
+    return namespace['Generated']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--functions', type=int, default=5000)
+    args = parser.parse_args()
+
+    code = compile(source(args.functions), 'generated', 'exec')
+    timings = []
+    for label in ('first definition', 'redefinition'):
+        start = perf_counter()
+        cls = define(code)
+        created = perf_counter()
+        cls.cexi_module.get_revision()
+        revised = perf_counter()
+        cls.cexi_module._code
+        generated = perf_counter()
+        timings.append((label, created - start, revised - created, generated - start))
+
+    print(f'{"":<18}{"class":>10}{"revision":>10}{"total":>10}')
+    for label, *seconds in timings:
+        print(f'{label:<18}' + ''.join(f'{t:>10.4f}' for t in seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Many processes (e.g. forked web workers) starting at once against one persistent module that isn't built yet.
+
+    python benchmarks/coldstart.py [--processes N] [--functions N]
+"""
+import sys
+import argparse
+import subprocess
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+
+MODULE = '''
+from cexi import Module, s
+
+
+class Cold(Module):
+    directory = {directory!r}
+
+    class options:
+        flags = ['-O2']
+
+{functions}
+
+print(Cold().f0(1))
+'''
+
+FUNCTION = '''
+    @s.py
+    def f{i}(x: int, /) -> int:
+        """
+        return x + {i};
+        """
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-p', '--processes', type=int, default=64)
+    parser.add_argument('-n', '--functions', type=int, default=200)
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        functions = ''.join(FUNCTION.format(i=i) for i in range(args.functions))
+        script = tmp / 'cold.py'
+        script.write_text(MODULE.format(directory=str(tmp / 'build'), functions=functions))
+
+        start = perf_counter()
+        workers = [
+            subprocess.Popen(
+                [sys.executable, str(script)], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+            )
+            for _ in range(args.processes)
+        ]
+        outputs = [worker.communicate()[0].strip() for worker in workers]
+        elapsed = perf_counter() - start
+
+        failed = sum(worker.returncode != 0 or output != '1' for worker, output in zip(workers, outputs))
+        libraries = list((tmp / 'build').glob('libCold.*.so'))
+        print(f'{args.processes} processes: {elapsed:.2f}s, {failed} failed, {len(libraries)} library')
+        sys.exit(1 if failed or len(libraries) != 1 else 0)
+
+
+if __name__ == '__main__':
+    main()
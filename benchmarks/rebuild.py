@@ -0,0 +1,46 @@
+"""
+Rebuild time of a large module after editing one function: one translation unit vs split units.
+
+    python benchmarks/rebuild.py [--functions N] [--units N]
+"""
+import argparse
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from cexi import Module, s
+
+
+def source(functions, edited):
+    lines = ['class Rebuild(Module):', '    directory = DIRECTORY', '    class options:', '        units = UNITS']
+    for i in range(functions):
+        lines += [
+            '    @s.py',
+            f'    def f{i}(x: int, y: "double") -> "double":',
+            f'        "return x * y + {i + edited * (i == 0)};"',
+        ]
+    return '\n'.join(lines)
+
+
+def build(functions, units, edited, directory):
+    namespace = {'Module': Module, 's': s, 'UNITS': units, 'DIRECTORY': directory}
+    exec(source(functions, edited), namespace)
+    start = perf_counter()
+    namespace['Rebuild'].cexi_module.compile()
+    return perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--functions', type=int, default=1000)
+    parser.add_argument('--units', type=int, default=64)
+    args = parser.parse_args()
+
+    print(f'{"":<14}{"build":>10}{"rebuild":>10}')
+    for label, units in (('single unit', None), (f'{args.units} units', args.units)):
+        with TemporaryDirectory() as directory:
+            timings = [build(args.functions, units, edited, directory) for edited in (0, 1)]
+        print(f'{label:<14}' + ''.join(f'{t:>10.3f}' for t in timings))
+
+
+if __name__ == '__main__':
+    main()
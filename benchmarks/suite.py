@@ -0,0 +1,226 @@
+"""
+Benchmark suite guarding generated code & the build pipeline against regressions.
+
+    python benchmarks/suite.py run [--output results.json] [--number N]
+    python benchmarks/suite.py compare <results.json | git revision> <results.json | git revision> [--threshold 5]
+
+Every case is reported in nanoseconds per call (or per build for `prepare/*`), lower is better. A git revision is
+checked out into a temporary worktree & benchmarked with this very script, so two commits compare in one command.
+"""
+import os
+import sys
+import json
+import argparse
+import platform
+import subprocess
+from pathlib import Path
+from timeit import repeat
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from uuid import uuid4
+
+from cexi import Module, s
+from cexi.leaks import SCALARS
+from cexi.typing import TypeTable
+
+
+ANNOTATIONS = {  # TypeTable's python column as it's written in an annotation
+    'bool': bool, 'chr': chr, 'str': str, 'int': int, 'float': float, 'complex': complex,
+    'bytes': bytes, 'bytearray': bytearray, 'object': object,
+}
+
+
+def annotation(source):
+    return ANNOTATIONS[source] if source in ANNOTATIONS else source.strip("'")
+
+
+def conversions():  # every TypeTable row that can cross the python/C boundary as an argument & a result
+    samples = {annotation(source): sample for source, sample in SCALARS}
+    lines = ['class Conversions(Module):', '    class options:', "        flags = ['-O2']"]
+    cases = []
+    for i, (python, name, _, _) in enumerate(TypeTable.table):
+        key = python.name if hasattr(python, 'name') else python
+        if key not in samples:  # no python counterpart (e.g. void, size_t) or not a value (None)
+            continue
+        source = next(source for source, _ in SCALARS if annotation(source) == key)
+        lines += ['    @s.py', f'    def {name}_{i}(x: {source}, /) -> {source}:', '        "return x;"']
+        cases.append((f'convert/{name}', f'{name}_{i}', (samples[key],)))
+    lines += ['    @s.py', '    def buffer(x: bin, /) -> int:', '        "return (int)x.len;"']
+    cases.append(('convert/bin', 'buffer', (b'cexi',)))
+    namespace = {'Module': Module, 's': s}
+    exec('\n'.join(lines), namespace)
+    return namespace['Conversions'](), cases
+
+
+class Calls(Module):
+
+    class options:
+        flags = ['-O2']
+
+    @s.share
+    def echo(self, x: int) -> int:
+        return x
+
+    @s.py
+    def single(x: int, y: int, /) -> int:
+        """
+        return x + y;
+        """
+
+    @s.py
+    def multi(x: int, y: int, /) -> (int, int):
+        """
+        return(x + y, x - y);
+        """
+
+    @s.py
+    def keywords(x: int, y: int = 1) -> int:
+        """
+        return x + y;
+        """
+
+    @s.py
+    def callbacks(n: int, /) -> int:
+        """
+        int acc = 0, r;
+        for (int i = 0; i < n; i++) {
+            if (echo(i, &r))
+                return -1;
+            acc += r;
+        }
+        return acc;
+        """
+
+
+def per_call(f, args, number, kwargs=None):
+    if kwargs:
+        return min(repeat(lambda: f(*args, **kwargs), number=number, repeat=5)) / number * 1e9
+    return min(repeat(lambda: f(*args), number=number, repeat=5)) / number * 1e9
+
+
+PREPARE = '''
+class Prepare(Module):
+    directory = {directory!r}
+
+    class options:
+        flags = ['-O2']
+
+    @s.py
+    def f(x: int, /) -> int:
+        """
+        return x + {nonce};
+        """
+'''
+
+
+def prepare(directory, nonce):
+    namespace = {'Module': Module, 's': s}
+    exec(PREPARE.format(directory=str(directory), nonce=nonce), namespace)
+    ext = namespace['Prepare'].cexi_module
+    start = perf_counter()
+    ext.prepare()
+    return (perf_counter() - start) * 1e9
+
+
+def run(number):
+    results = {}
+
+    def record(case, f, args, count=1, kwargs=None):
+        results[case] = per_call(f, args, number // count, kwargs) / count
+
+    conversions_module, cases = conversions()
+    for case, name, args in cases:
+        record(case, getattr(conversions_module, name), args)
+
+    calls = Calls()
+    record('return/single', calls.single, (1, 2))
+    record('return/multi', calls.multi, (1, 2))
+    record('call/positional', calls.keywords, (1, 2))
+    record('call/keyword', calls.keywords, (1,), kwargs={'y': 2})
+    record('call/default', calls.keywords, (1,))
+    proxies = {fun.name: proxy for fun, proxy in Calls.cexi_module.exported}
+    record('call/proxy', proxies['single'], (1, 2))
+    callbacks = 100
+    record('share/callback', calls.callbacks, (callbacks,), count=callbacks)
+
+    with TemporaryDirectory() as directory:
+        nonce = uuid4().int % 10 ** 9  # a revision nobody has built yet
+        results['prepare/cold'] = prepare(directory, nonce)
+        results['prepare/warm'] = min(prepare(directory, nonce) for _ in range(5))
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'python': sys.version, 'machine': platform.platform()}
+
+
+def load(target, number):
+    if Path(target).is_file():
+        return json.loads(Path(target).read_text())
+    root = Path(__file__).absolute().parent.parent
+    with TemporaryDirectory() as tmp:
+        tree, output = Path(tmp) / 'tree', Path(tmp) / 'results.json'
+        subprocess.run(['git', 'worktree', 'add', '--detach', str(tree), target], cwd=root, check=True,
+                       capture_output=True)
+        try:
+            env = {**os.environ, 'PYTHONPATH': str(tree / 'src')}
+            subprocess.run(
+                [sys.executable, str(Path(__file__).absolute()), 'run', '--output', str(output),
+                 '--number', str(number)],
+                cwd=tree, env=env, check=True,
+            )
+            return json.loads(output.read_text())
+        finally:
+            subprocess.run(['git', 'worktree', 'remove', '--force', str(tree)], cwd=root, capture_output=True)
+
+
+def compare(old, new, threshold):
+    regressions = 0
+    print(f'{"case":<22}{"old":>16}{"new":>16}{"change":>10}')
+    for case in sorted(old['results'].keys() | new['results'].keys()):
+        before, after = old['results'].get(case), new['results'].get(case)
+        if before is None or after is None:
+            print(f'{case:<22}{before or "-":>16}{after or "-":>16}')
+            continue
+        change = (after - before) / before * 100 if before else 0.0
+        flag = ''
+        if change > threshold:
+            regressions += 1
+            flag = '  slower'
+        print(f'{case:<22}{before:>16,.1f}{after:>16,.1f}{change:>+9.1f}%{flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run')
+    run_parser.add_argument('--output', type=str, default=None)
+    run_parser.add_argument('--number', type=int, default=200_000)
+    compare_parser = commands.add_parser('compare')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=5.0, help='% slowdown reported as a regression')
+    compare_parser.add_argument('--number', type=int, default=200_000)
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        report = {**environment(), 'unit': 'ns', 'results': run(args.number)}
+        if args.output:
+            Path(args.output).write_text(json.dumps(report, indent=2, sort_keys=True))
+        for case, value in report['results'].items():
+            print(f'{case:<22}{value:>16,.1f}')
+    else:
+        old, new = load(args.old, args.number), load(args.new, args.number)
+        sys.exit(1 if compare(old, new, args.threshold) else 0)
+
+
+if __name__ == '__main__':
+    main()
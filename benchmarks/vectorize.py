@@ -0,0 +1,52 @@
+"""
+Mapping a scalar @s.py function over many values: python loop vs batch entry point.
+
+    python benchmarks/vectorize.py [--size N]
+"""
+import argparse
+from array import array
+from timeit import repeat
+
+from cexi import Module, s
+
+
+class Vectorize(Module):
+
+    class options:
+        flags = ['-O2']
+
+    @s.py(vectorize=True)
+    def inc(x: int) -> int:
+        """
+        return x + 1;
+        """
+
+
+def best(f, number=5):
+    return min(repeat(f, number=1, repeat=number))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    v = Vectorize()
+    values = list(range(args.size))
+    buffer = array('i', values)
+    out = array('i', bytes(buffer.itemsize * args.size))
+
+    cases = (
+        ('python loop', lambda: [v.inc(x) for x in values]),
+        ('map(list)', lambda: v.inc_map(values)),
+        ('map(array)', lambda: v.inc_map(buffer)),
+        ('map(array, out)', lambda: v.inc_map(buffer, out)),
+    )
+    print(f'{"case":<18}{"seconds":>10}{"values/s":>16}')
+    for name, f in cases:
+        seconds = best(f)
+        print(f'{name:<18}{seconds:>10.4f}{args.size / seconds:>16,.0f}')
+
+
+if __name__ == '__main__':
+    main()
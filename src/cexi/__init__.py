@@ -1,2 +1,4 @@
 from .extension import Extension
 from .core import Module, s
+from .parallel import prepare_all
+from .typing import Array, Struct
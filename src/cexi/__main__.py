@@ -1,21 +1,73 @@
 import argparse
-from tempfile import TemporaryDirectory
+import pkgutil
+from pathlib import Path
 from importlib import import_module
 
+from . import prebuilt
+from .stats import report
+
 parser = argparse.ArgumentParser(description='Cee EXtensions Interpolation')
-parser.add_argument('path', type=str, nargs=1, help='Path to module in format <path>:<module>')
+parser.add_argument(
+    'path', type=str, nargs='+',
+    help='Path to module in format <path>:<module>, or a package to build every module of'
+)
+parser.add_argument(
+    '-o', '--output', type=str, default=None,
+    help=f'Directory for prebuilt libraries & their manifest (<package>/{prebuilt.DIRNAME} by default)'
+)
+parser.add_argument('-j', '--workers', type=int, default=None, help='Number of parallel builds')
+parser.add_argument(
+    '--report', action='store_true',
+    help='Prepare every module in place & print where the time went (codegen, compile, link, load, ...)'
+)
 args = parser.parse_args()
 
-path, name = args.path[0].split(':')
-cexi_extension = getattr(import_module(path), name)
-try:
-    dir = cexi_extension.dir
-    module = cexi_extension
-except AttributeError:
-    dir = cexi_extension.cexi_module.dir
-    module = cexi_extension.cexi_module
-
-if isinstance(dir, TemporaryDirectory):
-    raise Exception("Module isn't persistent")
+
+def extension_of(obj):
+    return getattr(obj, 'cexi_module', obj)
+
+
+def scan(package):
+    found = [package]
+    if hasattr(package, '__path__'):
+        for info in pkgutil.walk_packages(package.__path__, f'{package.__name__}.'):
+            found.append(import_module(info.name))
+    for module in found:
+        for obj in vars(module).values():
+            if isinstance(obj, type) and 'cexi_module' in vars(obj) and obj.__module__ == module.__name__:
+                yield obj.cexi_module
+
+
+def targets(paths):
+    for target in paths:
+        path, _, name = target.partition(':')
+        package = import_module(path)
+        if name:
+            yield package, [extension_of(getattr(package, name))]
+        else:
+            yield package, list(scan(package))
+
+
+if args.report:
+    extensions = list(dict.fromkeys(ext for _, found in targets(args.path) for ext in found))
+    for ext in extensions:  # one by one, so timings aren't skewed by concurrent builds
+        ext.prepare()
+    print(report(extensions))
+elif len(args.path) == 1 and ':' in args.path[0] and args.output is None:
+    path, name = args.path[0].split(':')
+    module = extension_of(getattr(import_module(path), name))
+
+    if not module.persistent:
+        raise Exception("Module isn't persistent")
+    else:
+        for variant in module.variants() or [module]:
+            variant.compile()
 else:
-    module.compile()
+    extensions, output = [], args.output
+    for package, found in targets(args.path):
+        extensions.extend(found)
+        if output is None:
+            output = Path(package.__file__).parent / prebuilt.DIRNAME
+
+    for name, build in prebuilt.build(list(dict.fromkeys(extensions)), output, args.workers).items():
+        print(f'{name} -> {build.libname}')
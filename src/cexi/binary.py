@@ -1,45 +1,248 @@
+import sys
+import shlex
 from pathlib import Path
-from os import environ, path, chdir
+from os import environ, cpu_count, getpid, rename, replace, utime
+from shutil import rmtree, which
+from functools import cache
+from subprocess import run, DEVNULL
+from uuid import uuid4
+from hashlib import blake2b
 from sysconfig import get_config_var
-from distutils.unixccompiler import UnixCCompiler
-from tempfile import TemporaryFile
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+from concurrent.futures import ThreadPoolExecutor
 from importlib.machinery import ExtensionFileLoader
+from importlib.util import spec_from_file_location, module_from_spec
+from sys import modules
 from contextlib import contextmanager
+from fcntl import flock, LOCK_EX, LOCK_UN
 
+from .exceptions import CompileError
+from .stats import Stats
 
-class Compiler(UnixCCompiler):
-    def compile_cexi_extension(self, extension, source_file, directory):
-        source_file.write(extension._code)
+
+class Compiler:  # drives the C compiler directly, every path is absolute so builds can run in threads
+    def __init__(self, command=None, launcher=None):
+        self.command = shlex.split(command or environ.get('CC') or 'cc')
+        self._launcher = launcher
+
+    @property
+    def launcher(self):
+        return _launcher() if self._launcher is None else list(self._launcher)
+
+    def compiling(self, flags, *args):
+        return [*self.command, '-pipe', '-fPIC', *flags, f'-I{get_config_var("INCLUDEPY")}', *args]
+
+    def spawn(self, command):
+        result = run(command, capture_output=True, text=True, stdin=DEVNULL)
+        if result.stderr:  # warnings & errors, as if the compiler wrote them itself
+            sys.stderr.write(result.stderr)
+        if result.returncode:
+            raise CompileError(f'command {shlex.join(command)!r} failed with exit code {result.returncode}')
+
+    def compile_cexi_source(self, name, code, flags, source_file, directory, link_flags=(), stats=None):
+        stats = Stats() if stats is None else stats
+        source_file.write(code)
         source_file.flush()
 
-        self.add_include_dir(get_config_var("INCLUDEPY"))
+        source = Path(source_file.name).absolute()
+        library = Path(directory).absolute() / library_filename(name)
+        if not self.launcher:
+            with stats.timed('compile'):
+                self.spawn(self.compiling(flags, '-shared', str(source), '-o', str(library), *link_flags))
+            return
+
+        obj = source.with_suffix('.o')  # launchers only cache compiling to objects, not linking
+        try:
+            self.compile_cexi_object(source, obj, flags, stats)
+            with stats.timed('link'):
+                self.link_shared_lib([obj], library, link_flags)
+        finally:
+            obj.unlink(missing_ok=True)
+
+    def compile_cexi_object(self, source, obj, flags, stats=None):
+        stats = Stats() if stats is None else stats
+        temp = obj.with_name(f'.{obj.name}.{getpid()}.{uuid4().hex}')
+        try:
+            with stats.timed('compile'):
+                self.spawn([*self.launcher, *self.compiling(flags, '-c', str(source), '-o', str(temp))])
+            replace(temp, obj)
+        finally:
+            temp.unlink(missing_ok=True)
+
+    def compile_cexi_header(self, header, flags):
+        self.spawn(self.compiling(flags, '-x', 'c-header', str(header), '-o', f'{header}.gch'))
+
+    def link_shared_lib(self, objects, library, link_flags=()):
+        self.spawn([*self.command, '-shared', *map(str, objects), '-o', str(library), *link_flags])
+
+    def identity(self):
+        return self.command, _version(self.command[0]).partition('\n')[0]
+
+    def supports_precompiled_headers(self):
+        return _is_gcc(self.command[0])
+
+    def object_key(self, header, code, flags):
+        h = blake2b(digest_size=16)
+        for part in (self.command, flags, get_config_var('INCLUDEPY'), header, code):
+            h.update(repr(part).encode())
+            h.update(b'\0')
+        return h.hexdigest()
+
+
+@cache
+def _launcher():  # ccache/sccache when installed, $CEXI_LAUNCHER picks one explicitly (empty disables it)
+    if (launcher := environ.get('CEXI_LAUNCHER')) is not None:
+        return shlex.split(launcher)
+    for name in ('ccache', 'sccache'):
+        if found := which(name):
+            return [found]
+    return []
+
+
+@cache
+def _version(executable):
+    try:
+        return run([executable, '--version'], capture_output=True, text=True, stdin=DEVNULL).stdout
+    except OSError:
+        return ''
+
+
+def _is_gcc(executable):  # clang only reads precompiled headers given explicitly
+    return 'Free Software Foundation' in _version(executable)
+
+
+PRECOMPILED_HEADER = 'preamble.h'
+
+
+def precompile(compiler, preamble, flags, headers):
+    entry = Path(headers) / compiler.object_key(preamble, None, flags)
+    header = entry / PRECOMPILED_HEADER
+    if Path(f'{header}.gch').exists():
+        utime(entry)
+        return header
+
+    staging = entry.with_name(f'.staging-{getpid()}-{uuid4().hex}')
+    staging.mkdir(parents=True)
+    try:
+        (staging / PRECOMPILED_HEADER).write_text(preamble)
+        compiler.compile_cexi_header(staging / PRECOMPILED_HEADER, flags)
+        rename(staging, entry)
+    except CompileError:  # leave it to the real build to report
+        return None
+    except OSError:  # someone else has published the same header first
+        pass
+    finally:
+        rmtree(staging, ignore_errors=True)
+    return header if Path(f'{header}.gch').exists() else None
+
+
+def strip_preamble(compiler, code, preamble, flags, headers):
+    if not (preamble and headers and code.startswith(preamble)):
+        return None, code
+    if not compiler.supports_precompiled_headers():
+        return None, code
+    if header := precompile(compiler, preamble, flags, headers):
+        return header, code[len(preamble):]
+    return None, code
+
+
+def library_filename(name):
+    return f'lib{name}.so'
+
+
+def build(name, code, flags, directory, preamble=None, headers=None, exclusive=False, link_flags=()):
+    compiler, stats = Compiler(), Stats()
+    with stats.timed('compile'):
+        header, code = strip_preamble(compiler, code, preamble, flags, headers)
+    if header:
+        code = f'#include "{header}"\n{code}'
+    with NamedTemporaryFile(dir=directory, mode='wt', suffix='.c') as source:
+        compiler.compile_cexi_source(name, code, flags, source, directory, link_flags, stats)
+    if exclusive:
+        prune_headers(headers, header)
+    return stats
+
+
+def build_profiled(name, code, flags, directory, source, link_flags=()):
+    # gcc matches profiles by object path, so both builds need the same source name & directory. Launchers compile
+    # into temporary objects, whose names would differ between the builds, hence they are bypassed
+    directory, stats = Path(directory), Stats()
+    directory.mkdir(parents=True, exist_ok=True)
+    try:
+        with open(directory / source, 'wt') as file:
+            Compiler(launcher=()).compile_cexi_source(name, code, flags, file, directory, link_flags, stats)
+    finally:
+        (directory / source).unlink(missing_ok=True)
+    return stats
+
+
+UNIT_HEADER = 'cexi.h'
+
+
+def build_units(name, header, units, flags, directory, objects=None, exclusive=False, workers=None,
+                preamble=None, headers=None, link_flags=()):
+    compiler, stats = Compiler(), Stats()
+    directory = Path(directory)
+    with stats.timed('compile'):
+        precompiled, rest = strip_preamble(compiler, header, preamble, flags, headers)
+    with TemporaryDirectory(dir=directory) as sources:
+        sources = Path(sources)
+        objects = Path(objects) if objects else sources
+        objects.mkdir(parents=True, exist_ok=True)
+        (sources / UNIT_HEADER).write_text(rest)
+
+        linked, pending = [], []
+        for unit, code in units.items():
+            obj = objects / f'{compiler.object_key(header, code, flags)}.o'
+            linked.append(obj)
+            if obj.exists():  # unchanged since some earlier revision
+                utime(obj)
+                continue
+            source = sources / f'{unit}.c'
+            source.write_text(f'#include "{precompiled}"\n{code}' if precompiled else code)
+            pending.append((source, obj))
+
+        with stats.timed('compile'), ThreadPoolExecutor(min(workers or cpu_count() or 1, len(pending) or 1)) as pool:
+            for job in [pool.submit(compiler.compile_cexi_object, *job, flags) for job in pending]:
+                job.result()
+        with stats.timed('link'):
+            compiler.link_shared_lib(linked, directory.absolute() / library_filename(name), link_flags)
+
+    if exclusive:
+        for obj in set(objects.glob('*.o')) - set(linked):
+            obj.unlink(missing_ok=True)
+        prune_headers(headers, precompiled)
+    return stats
+
 
-        extra_preargs = ["-fPIC"]
-        extra_postargs = []
+def prune_headers(headers, current):
+    if not headers or not Path(headers).exists():
+        return
+    for entry in Path(headers).iterdir():
+        if current is None or entry != current.parent:
+            rmtree(entry, ignore_errors=True)
 
-        if options := extension.options:
-            if flags := options.get('flags'):
-                extra_preargs.extend(flags)
 
-        origin = Path().absolute()
+@contextmanager
+def file_lock(path):  # advisory, held by one process at a time; the file itself is never removed
+    if path is None:
+        yield
+        return
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a') as file:
+        flock(file, LOCK_EX)
         try:
-            chdir(directory)
-            files = self.compile(
-                [Path(source_file.name).name],
-                extra_preargs=extra_preargs,
-                extra_postargs=extra_postargs,
-            )
-            self.link_shared_lib(files, path.join(directory, extension.name))
+            yield
         finally:
-            chdir(origin)
+            flock(file, LOCK_UN)
 
 
 class Loader:
-    def load_cexi_extension(self, extension, directory):
-        cc = Compiler()
-        libfile = cc.library_filename(
-            extension.name, lib_type="shared"
-        )
-        loader = ExtensionFileLoader(extension.name, path.join(directory, libfile))
-        module = loader.load_module()
+    def load_cexi_library(self, name, libfile):
+        libfile = str(libfile)
+        loader = ExtensionFileLoader(name, libfile)
+        spec = spec_from_file_location(name, libfile, loader=loader)
+        module = module_from_spec(spec)  # a fresh module per library, even if the name is taken
+        loader.exec_module(module)
+        modules[name] = module
         return module
@@ -0,0 +1,111 @@
+from os import environ, getpid, rename, utime
+from shutil import rmtree
+from pathlib import Path
+from hashlib import blake2b
+from sysconfig import get_config_var
+from uuid import uuid4
+
+from .binary import Compiler
+
+
+DEFAULT_SIZE = 512 * 1024 * 1024
+LAYOUT = 2  # bump whenever files inside cache entries are named differently
+
+
+def default_root():
+    if root := environ.get('CEXI_CACHE_DIR'):
+        return Path(root)
+    base = environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(base) / 'cexi'
+
+
+class BuildCache:
+    def __init__(self, root=None, size=None):
+        self.root = Path(root or default_root()).absolute()
+        self.size = int(size or environ.get('CEXI_CACHE_SIZE', DEFAULT_SIZE))
+
+    def key(self, extension):
+        h = blake2b(digest_size=16)
+        for part in (
+            LAYOUT,
+            extension.name,
+            extension.get_revision(),
+            Compiler().command,
+            extension.flags,
+            get_config_var('SOABI'),
+        ):
+            h.update(repr(part).encode())
+            h.update(b'\0')
+        return h.hexdigest()
+
+    def entry(self, extension):
+        return self.root / self.key(extension)
+
+    @property
+    def objects(self):  # object files of split extensions, shared between revisions
+        return self.root / '.objects'
+
+    @property
+    def headers(self):  # precompiled preambles, shared between revisions & modules
+        return self.root / '.headers'
+
+    @property
+    def locks(self):  # taken while compiling, so concurrent processes build each module once
+        return self.root / '.locks'
+
+    def touch(self, entry):
+        try:
+            utime(entry)
+        except OSError:
+            pass
+
+    def staging(self):
+        path = self.root / f'.staging-{getpid()}-{uuid4().hex}'
+        path.mkdir(parents=True)
+        return path
+
+    def commit(self, staging, entry):
+        try:
+            rename(staging, entry)
+        except OSError:  # someone else has published the same entry first
+            rmtree(staging, ignore_errors=True)
+        self.evict(keep=entry)
+
+    def entries(self):
+        if not self.root.exists():
+            return []
+        entries = [p for p in self.root.iterdir() if p.is_dir() and not p.name.startswith('.')]
+        if self.objects.exists():
+            entries.extend(self.objects.glob('*.o'))
+        if self.headers.exists():
+            entries.extend(p for p in self.headers.iterdir() if not p.name.startswith('.'))
+        return entries
+
+    def remove(self, entry):
+        if entry.is_dir():
+            rmtree(entry, ignore_errors=True)
+        else:
+            entry.unlink(missing_ok=True)
+
+    def evict(self, keep=None):
+        sized = []
+        for entry in self.entries():
+            try:
+                stat = entry.stat()
+                size = sum(f.stat().st_size for f in entry.iterdir()) if entry.is_dir() else stat.st_size
+            except OSError:
+                continue
+            sized.append((stat.st_mtime, size, entry))
+
+        total = sum(size for _, size, _ in sized)
+        for _, size, entry in sorted(sized, key=lambda x: x[0]):
+            if total <= self.size:
+                break
+            if entry == keep:
+                continue
+            self.remove(entry)
+            total -= size
+
+    def clear(self):
+        for entry in self.entries():
+            self.remove(entry)
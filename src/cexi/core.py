@@ -1,11 +1,15 @@
 from pathlib import Path
+from functools import partial
 
 from .extension import Extension
 
 
 class Signature:
-    def py(self, obj):
+    def py(self, obj=None, **options):
+        if obj is None:
+            return partial(self.py, **options)
         obj._cexi_sig = 'py'
+        obj._cexi_options = options
         return obj
 
     def cee(self, obj):
@@ -22,7 +26,8 @@ class Signature:
             if sig := getattr(obj, '_cexi_sig', None):
                 delattr(obj, '_cexi_sig')
                 if sig == 'py':
-                    attrs[k] = ext.py(obj)
+                    options = obj.__dict__.pop('_cexi_options', {})
+                    attrs[k] = ext.py(obj, **options)
                 elif sig == 'cee':
                     ext.cee(obj)
                     attrs.pop(k)
@@ -41,11 +46,15 @@ class CexiMeta(type):
             else:
                 directory = attrs.pop('directory', None)
             options = attrs['options'].__dict__ if 'options' in attrs else None
-            module = Extension(name, dir=directory, options=options)
+            origin = (attrs.get('__module__'), attrs.get('__qualname__'))
+            module = Extension(name, dir=directory, options=options, origin=origin)
             if doc := attrs.pop('__doc__', None):
                 module.block(doc)
             s.process(module, attrs)
             attrs['cexi_module'] = module
+            cls = super().__new__(mcls, name, bases, attrs)
+            module.bind(cls)
+            return cls
         return super().__new__(mcls, name, bases, attrs)
 
 
@@ -53,4 +62,5 @@ class Module(metaclass=CexiMeta):
     directory = None
 
     def __init__(self):
-        self.cexi_module.prepare()
+        if not self.cexi_module.lazy:
+            self.cexi_module.prepare()
@@ -0,0 +1,19 @@
+from functools import cache
+from pathlib import Path
+
+
+@cache
+def features():
+    try:
+        cpuinfo = Path('/proc/cpuinfo').read_text()
+    except OSError:
+        return frozenset()
+    for line in cpuinfo.splitlines():
+        key, _, value = line.partition(':')
+        if key.strip() in ('flags', 'Features'):
+            return frozenset(value.split())
+    return frozenset()
+
+
+def supports(*names):
+    return set(names) <= features()
@@ -24,3 +24,19 @@ class NotInitialized(Exception):
 
 class Misconfigured(Exception):
     pass
+
+
+class CompileError(Exception):
+    pass
+
+
+class GILRequired(Exception):
+    pass
+
+
+class NotVectorizable(Exception):
+    pass
+
+
+class Leaking(Exception):
+    pass
@@ -2,30 +2,55 @@ from uuid import uuid4
 from pathlib import Path
 from textwrap import indent
 from functools import cached_property, partial
-from tempfile import NamedTemporaryFile, TemporaryDirectory
+from contextlib import contextmanager, ExitStack
+from threading import RLock
+from tempfile import TemporaryDirectory
 from hashlib import blake2b
+from shutil import rmtree
+from os import environ, getpid, replace
+from sys import version, modules
+from sysconfig import get_config_var
+from ctypes import CDLL
 
 from .constants import TAB, ALLOWED_CHARACTERS
-from .exceptions import IncorrectExtensionName
+from .exceptions import IncorrectExtensionName, Misconfigured
 from . import templates
 from . import statement
-from .binary import Compiler, Loader
+from . import prebuilt
+from .typing import Array, is_struct
+from .binary import Compiler, Loader, build, build_units, build_profiled, library_filename, file_lock, UNIT_HEADER
+from .cache import BuildCache
+from .stats import Stats, publish
 
 
 class Extension:
-    def __init__(self, name: str, dir=None, options=None):
+    current = {}  # origin => latest loaded extension
+
+    def __init__(self, name: str, dir=None, options=None, cache=None, origin=None):
         if set(name) - ALLOWED_CHARACTERS:
             raise IncorrectExtensionName(name)
 
         self.name = name
+        self.options = options
+        self.cache = None
         if dir:
             self.dir = Path(dir).absolute()
             self.dir.mkdir(parents=True, exist_ok=True)
+        elif cache is not False and (options or {}).get('cache', True):
+            self.dir = None
+            self.cache = cache or BuildCache()
         else:
             self.dir = TemporaryDirectory()
-        self.options = options
         self.code = []
         self.shared = []
+        self.structs = {}  # cee name => StructType
+        self.defaults = []
+        self.exported = []
+        self.targets = []
+        self.lock = RLock()
+        self.origin = origin
+        self.superseded = []
+        self.stats = Stats()
 
         self.__capitalized = self.name.capitalize()
         self.__error_name = f"{self.__capitalized}Error"
@@ -38,6 +63,78 @@ class Extension:
     # API #
     #######
 
+    @property
+    def persistent(self):
+        return isinstance(self.dir, Path)
+
+    @property
+    def lazy(self):
+        return bool((self.options or {}).get('lazy'))
+
+    @property
+    def reload(self):
+        return bool((self.options or {}).get('reload')) and self.origin is not None
+
+    @property
+    def units(self):
+        return (self.options or {}).get('units')
+
+    @property
+    def pgo(self):
+        return (self.options or {}).get('pgo')
+
+    @property
+    def counters(self):
+        return (self.options or {}).get('counters', False)
+
+    @property
+    def pch(self):
+        return (self.options or {}).get('pch', True)
+
+    @property
+    def flags(self):
+        flags = list((self.options or {}).get('flags') or ())
+        if self.variant:
+            flags.extend(self.options['variants'][self.variant])
+        return flags
+
+    @property
+    def link_flags(self):  # e.g. `linker = 'mold'` in options or $CEXI_LINKER, for -fuse-ld
+        linker = environ.get('CEXI_LINKER') or (self.options or {}).get('linker')
+        return [f'-fuse-ld={linker}'] if linker else []
+
+    @cached_property
+    def variant(self):
+        variants = (self.options or {}).get('variants')
+        if not variants:
+            return None
+        choice = environ.get('CEXI_VARIANT') or self.options.get('variant') or next(iter(variants))
+        if callable(choice):
+            choice = choice()
+        if choice not in variants:
+            raise Misconfigured(self.name, f'unknown variant {choice!r}, expected one of {list(variants)}')
+        return choice
+
+    def variants(self):
+        return [
+            self if name == self.variant else self.for_variant(name)
+            for name in (self.options or {}).get('variants') or ()
+        ]
+
+    def for_variant(self, name, dir=None):
+        ext = Extension(
+            self.name, dir=dir or (self.dir if self.persistent else None), options=self.options,
+            cache=self.cache or False, origin=None,
+        )
+        ext.variant = name
+        ext.code, ext.shared, ext.exported = self.code, self.shared, self.exported
+        ext.structs, ext.defaults = self.structs, self.defaults
+        return ext
+
+    @property
+    def configuration(self):  # everything besides the source that ends up in the binary
+        return self.flags, self.link_flags, Compiler().identity(), get_config_var('SOABI'), version
+
     @cached_property
     def exception(self):
         module = import_module(self.name)
@@ -48,25 +145,52 @@ class Extension:
 
     def cee(self, fun):
         cexi_fun = statement.CeeCallable(fun, self)
+        self.__define_structs(cexi_fun)
         self.code.append(cexi_fun)
         return cexi_fun
 
-    def py(self, fun):
-        cexi_fun = statement.PyCallable(fun, self)
+    def py(self, fun, **options):
+        cexi_fun = statement.PyCallable(fun, self, **options)
+        self.__define_structs(cexi_fun)
         self.code.append(cexi_fun)
-        return cexi_fun.proxy()
+        proxy = cexi_fun.proxy()
+        self.exported.append((cexi_fun, proxy))
+        if cexi_fun.defaults:
+            defaults = statement.Defaults(cexi_fun)
+            self.code.append(defaults)
+            self.defaults.append(defaults)
+        if cexi_fun.vectorize:
+            vectorized = statement.Vectorized(cexi_fun)
+            self.code.append(vectorized)
+            self.exported.append((vectorized, vectorized.proxy()))
+        return proxy
 
     def share(self, fun):
         fun, orig = partial(fun, None), fun
         fun.__name__ = orig.__name__
         capture = statement.Capture(fun, self)
         reverse = statement.Share(fun, self, capture)
+        if any(is_struct(type) for type in reverse.returns):
+            raise Misconfigured(self.name, f'.share function {orig.__name__} can\'t return structs')
+        self.__define_structs(reverse)
         self.code.append(capture)
         self.code.append(reverse)
         proxy = reverse.proxy()
         self.shared.append(proxy)
         return fun
 
+    def __define_structs(self, fun):
+        for type in (*fun.params.values(), *fun.returns):
+            type = type.type if isinstance(type, Array) else type
+            if not is_struct(type):
+                continue
+            known = self.structs.get(type.__name__)
+            if known is None:
+                self.structs[type.__name__] = known = statement.StructType(type, self)
+                self.code.append(known)
+            elif known.obj is not type:
+                raise Misconfigured(self.name, f'struct {type.__name__} is defined more than once')
+
     ###########
     # codegen #
     ###########
@@ -74,29 +198,41 @@ class Extension:
     def get_revision(self, source=None):
         h = blake2b(digest_size=7)
         h.update((source or self._code_without_revision).encode())
+        h.update(repr(self.configuration).encode())
         return abs(int(h.hexdigest(), 16))
 
     @cached_property
     def __mandatory_header(self):
         return templates.MANDATORY_HEADER
 
+    @cached_property
+    def __converters(self):
+        if self.counters:
+            return f'{templates.CONVERTERS}\n{templates.COUNTER_HELPERS}'
+        return templates.CONVERTERS
+
+    @cached_property
+    def __statements(self):
+        return [*self.code, statement.Counters(self)] if self.counters else self.code
+
     @cached_property
     def __error_definition(self):
         return templates.ERROR.substitute(error=self.__error_name)
 
     @cached_property
     def __module_code(self):
-        return "\n\n\n".join(statement.translate() for statement in self.code)
+        return "\n\n\n".join(statement.translate() for statement in self.__statements)
+
+    @staticmethod
+    def __methods(code):
+        entries = [obj.table_entry for obj in code if getattr(obj, 'table_entry', None)]
+        methods = (",\n".join(entries) + ",\n    ") if entries else ""
+        return indent(methods, TAB).lstrip()
 
     @cached_property
     def __method_table(self):
-        methods = (",\n".join(
-            obj.table_entry for obj in self.code
-            if isinstance(obj, statement.PyCallable)
-        ) + ",\n    ") if self.code else ""
-        methods = indent(methods, TAB).lstrip()
         return templates.METHOD_TABLE.substitute(
-            name=self.__method_table_name, methods=methods
+            name=self.__method_table_name, methods=self.__methods(self.__statements)
         )
 
     @cached_property
@@ -112,67 +248,321 @@ class Extension:
             name=self.name, module=self.__module_name, error=self.__error_name
         )
 
-    def __module_init_with_revision(self, source):
+    def __module_init_with_revision(self, source, units=''):
         return templates.MODULE_INIT_WITH_REVISION.substitute(
             name=self.name, module=self.__module_name, error=self.__error_name,
-            revision=self.get_revision(source)
+            revision=self.get_revision(source), units=units
         )
 
     @cached_property
-    def _code_without_revision(self):
+    def __module_body(self):
         return templates.MODULE_CODE.substitute(
             header=self.__mandatory_header,
+            converters=self.__converters,
             error=self.__error_definition,
             code=self.__module_code,
             method_table=self.__method_table,
             module_definition=self.__module_definition,
-            module_init=self.__module_init(),
         )
 
+    @cached_property
+    def _code_without_revision(self):
+        return f'{self.__module_body}\n\n{self.__module_init()}'
+
     @cached_property
     def _code(self):
-        return templates.MODULE_CODE.substitute(
+        return f'{self.__module_body}\n\n{self.__module_init_with_revision(self._code_without_revision)}'
+
+    @cached_property
+    def __leading_blocks(self):
+        blocks = []
+        for obj in self.code:
+            if isinstance(obj, (statement.CeeCallable, statement.StructType)):
+                break
+            blocks.append(obj.translate())
+        return blocks
+
+    @cached_property
+    def _preamble(self):  # the part of the source shared by every build, worth precompiling
+        if self.units:
+            error, delim = f'extern PyObject* {self.__error_name};', "\n\n"
+        else:
+            error, delim = self.__error_definition, "\n\n\n"
+        return f'{self.__mandatory_header}\n\n{self.__converters}\n\n{error}\n\n' + delim.join(self.__leading_blocks)
+
+    def __partition(self):
+        groups, structs = [], []
+        for obj in self.__statements:
+            if isinstance(obj, statement.Counters):
+                groups.append([obj])
+            elif isinstance(obj, statement.StructType):
+                structs.append(obj)  # defined along with the first function using it
+            elif not isinstance(obj, (statement.CeeCallable, statement.Defaults)):
+                continue  # plain blocks go to the shared header
+            elif isinstance(obj, (statement.Vectorized, statement.Share, statement.Defaults)):
+                groups[-1].append(obj)  # must see the static symbols of their scalar/capture
+            else:
+                groups.append([obj, *structs])
+                structs = []
+
+        if self.units is True:
+            return {group[0].name: group for group in groups}
+        units = {}
+        for group in groups:  # a stable assignment, so an edit dirties a single unit
+            h = blake2b(group[0].name.encode(), digest_size=4)
+            units.setdefault(str(int(h.hexdigest(), 16) % self.units), []).extend(group)
+        return units
+
+    @cached_property
+    def _units(self):
+        header = templates.UNIT_HEADER.substitute(
             header=self.__mandatory_header,
-            error=self.__error_definition,
-            code=self.__module_code,
-            method_table=self.__method_table,
+            converters=self.__converters,
+            error=self.__error_name,
+            declarations="\n\n".join(filter(None, (obj.declaration for obj in self.__statements))),
+        )
+
+        units, adders = {}, []
+        for unit, code in self.__partition().items():
+            adder = f'{self.__module_name}_unit_{unit}'
+            adders.append(adder)
+            units[unit] = templates.UNIT.substitute(
+                header=UNIT_HEADER,
+                code="\n\n\n".join(obj.translate() for obj in code),
+                table=f'{adder}_methods',
+                methods=self.__methods(code),
+                adder=adder,
+            )
+
+        calls = "\n    ".join(templates.UNIT_ADD.substitute(adder=a, name=self.name) for a in adders)
+        units[self.__module_name] = templates.UNIT_MAIN.substitute(
+            header=UNIT_HEADER,
+            error=self.__error_name,
+            adders="\n".join(f'int {adder}(PyObject *module);' for adder in adders),
+            method_table=templates.METHOD_TABLE.substitute(name=self.__method_table_name, methods=""),
             module_definition=self.__module_definition,
-            module_init=self.__module_init_with_revision(source=self._code_without_revision),
+            module_init=self.__module_init_with_revision(
+                self._code_without_revision, units=f'    {calls}\n\n' if adders else ''
+            ),
         )
+        return header, units
 
     #########################
     # compilation & loading #
     #########################
 
+    def directory(self):
+        if self.cache:
+            return self.cache.entry(self)
+        return Path(self.dir.name) if isinstance(self.dir, TemporaryDirectory) else self.dir
+
+    @property
+    def stem(self):
+        return f'{self.name}.{self.variant}' if self.variant else self.name
+
+    @property
+    def libname(self):
+        return f'{self.stem}.{self.get_revision()}'
+
+    def build_directory(self):
+        if self.cache:
+            return self.cache.staging()
+        if self.persistent:  # other processes may load the library while it's being linked
+            staging = self.dir / f'.{self.stem}.staging-{getpid()}-{uuid4().hex}'
+            staging.mkdir()
+            return staging
+        return self.directory()
+
+    @contextmanager
+    def staged(self):  # a build directory that doesn't outlive a failed build
+        dir = self.build_directory()
+        try:
+            yield dir
+        except BaseException:
+            if self.cache or self.persistent:
+                rmtree(dir, ignore_errors=True)
+            raise
+
+    def publish(self, dir):
+        if self.cache:
+            self.cache.commit(dir, self.directory())
+        elif self.persistent:
+            libfile = library_filename(self.libname)
+            replace(dir / libfile, self.dir / libfile)
+            rmtree(dir, ignore_errors=True)
+            self.prune()
+            if self.headers():
+                BuildCache().evict()
+
+    def lockfile(self):
+        if self.cache:
+            return self.cache.locks / f'{self.cache.key(self)}.lock'  # the cache is shared by unrelated modules
+        return self.dir / f'.{self.stem}.lock' if self.persistent else None
+
+    @contextmanager
+    def compilation(self):  # yields whether this process has to compile, others wait & load its result
+        with ExitStack() as lock:
+            with self.stats.timed('lock'):
+                lock.enter_context(file_lock(self.lockfile()))
+            yield self.is_compilation_required()
+
+    def generate(self):  # codegen is lazy, run it upfront so it's measured on its own
+        with self.stats.timed('codegen'):
+            return self._units if self.units else self._code
+
+    def prune(self):
+        current = library_filename(self.libname)
+        for lib in self.dir.glob(library_filename(f'{self.stem}.[0-9]*')):
+            if lib.name != current:
+                lib.unlink(missing_ok=True)
+
+    def objects(self):
+        if self.cache:
+            return self.cache.objects
+        return self.dir / f'{self.stem}.objects' if self.persistent else None
+
+    def headers(self):
+        if not self.pch:
+            return None
+        if self.cache:
+            return self.cache.headers
+        if self.persistent and (self.options or {}).get('cache', True):  # only the library goes to its directory
+            return BuildCache().headers
+        return None
+
+    def build_job(self, dir):
+        headers = self.headers()
+        preamble = self._preamble if headers else None
+        if self.units:
+            return build_units, (
+                self.libname, *self._units, self.flags, dir, self.objects(), self.persistent, None,
+                preamble, headers, self.link_flags,
+            )
+        return build, (
+            self.libname, self._code, self.flags, dir, preamble, headers, self.persistent, self.link_flags,
+        )
+
+    def profiles(self):
+        return self.dir / f'{self.stem}.profiles' / str(self.get_revision())
+
+    def compile_with_profile(self):
+        if not self.persistent:
+            raise Misconfigured(self.name, 'profile-guided builds need a persistent directory')
+
+        work, source = self.dir / f'{self.stem}.pgo', f'{self.name}.c'
+        profiles, libfile = self.profiles(), library_filename(self.libname)
+        if not any(profiles.rglob('*.gcda')):  # gcc nests them under the mangled object path
+            generate = f'-fprofile-generate={profiles}'
+            self.stats.merge(build_profiled(
+                self.libname, self._code + templates.PROFILE_DUMP, [*self.flags, generate], work, source,
+                link_flags=[generate, *self.link_flags],
+            ))
+            self.load_library(work / libfile)
+            self.pgo(self.targets[0]() if self.targets else self.module)
+            CDLL(str(work / libfile)).cexi_profile_dump()
+            self.module = None  # the instrumented build is for training only
+            self.rebind()
+
+        self.stats.merge(build_profiled(
+            self.libname, self._code,
+            [*self.flags, f'-fprofile-use={profiles}', '-fprofile-correction', '-Werror=missing-profile'],
+            work, source, self.link_flags,
+        ))
+        replace(work / libfile, self.dir / libfile)
+        for stale in profiles.parent.iterdir():
+            if stale != profiles:
+                rmtree(stale, ignore_errors=True)
+        self.prune()
+
     def compile(self):
-        dir = Path(self.dir.name) if isinstance(self.dir, TemporaryDirectory) else self.dir
-        with NamedTemporaryFile(dir=dir, mode='wt', suffix='.c') as source:
-            Compiler().compile_cexi_extension(self, source, dir)
+        self.stats['cache'] = 'miss'
+        if self.pgo:
+            return self.compile_with_profile()
+        with self.staged() as dir:
+            fun, args = self.build_job(dir)
+            self.stats.merge(fun(*args))
+            self.publish(dir)
 
-    def load_shared(self):
+    def load_shared(self, module):
+        for struct in self.structs.values():
+            getattr(module, struct.function)(struct.obj)
+        for defaults in self.defaults:
+            getattr(module, defaults.function)(defaults.values)
         for fun in self.shared:
-            fun._cexi_capture_callback()
+            fun._cexi_capture_callback(module)
+
+    def bind(self, target):
+        self.targets.append(target)
+        self.__bind(target)
+
+    def __bind(self, target):
+        for fun, proxy in self.exported:
+            setattr(target, fun.name, getattr(self.module, fun.name, proxy) if self.module else proxy)
+
+    def rebind(self):
+        for target in self.targets:
+            self.__bind(target)
 
     def load(self):
-        dir = Path(self.dir.name) if isinstance(self.dir, TemporaryDirectory) else self.dir
-        self.module = Loader().load_cexi_extension(self, dir)
-        if isinstance(self.dir, TemporaryDirectory):
+        dir = self.directory()
+        self.load_library(dir / library_filename(self.libname))
+        if self.cache:
+            self.cache.touch(dir)
+        elif isinstance(self.dir, TemporaryDirectory):
             self.dir.cleanup()
-        self.load_shared()
 
-    def is_recompilation_required(self):
-        return self.module.cexi_revision != self.get_revision() if self.module else self.is_compilation_required()
+    def load_library(self, libfile):
+        with self.stats.timed('load'):
+            module = Loader().load_cexi_library(self.name, libfile)
+        self.stats['size'] = Path(libfile).stat().st_size
+        with self.stats.timed('capture'):
+            self.load_shared(module)
+        self.swap(module)
+        publish(self, self.stats)
+
+    def swap(self, module):
+        self.module = module
+        self.rebind()
+        if not self.reload or not self.redefined():
+            return
+        previous = self.current.get(self.origin)
+        self.current[self.origin] = self
+        if previous is not None and previous is not self:
+            self.superseded.extend((previous, *previous.superseded))
+            previous.superseded.clear()
+        # an old definition whose functions are gone keeps running its own revision
+        self.superseded = [
+            old for old in self.superseded if all(hasattr(module, fun.name) for fun, _ in old.exported)
+        ]
+        for old in self.superseded:
+            old.module = module
+            old.rebind()
+
+    def redefined(self):  # whether the class in its module's namespace is ours, e.g. after importlib.reload
+        obj = modules.get(self.origin[0])
+        for part in self.origin[1].split('.'):
+            obj = getattr(obj, part, None)
+        return obj is not None and obj in self.targets
+
+    def is_compilation_required(self):
+        if isinstance(self.dir, TemporaryDirectory):
+            return True
+        return not (self.directory() / library_filename(self.libname)).exists()
 
     def prepare(self):
         if self.module:
             return
 
-        try:
+        with self.lock:
+            if self.module:
+                return
+            self.generate()
+            if libfile := prebuilt.find(self):
+                self.stats['cache'] = 'prebuilt'
+                return self.load_library(libfile)
+            self.stats.setdefault('cache', 'hit')
+            if self.is_compilation_required():
+                with self.compilation() as required:
+                    if required:
+                        self.compile()
             self.load()
-        except ImportError:
-            self.compile()
-            self.load()
-        else:
-            if self.is_recompilation_required():
-                self.compile()
-                self.load()
@@ -0,0 +1,154 @@
+import gc
+import sys
+import tracemalloc
+from array import array
+
+from .core import Module, s
+from .exceptions import Leaking
+from .typing import Array, TypeTable
+
+
+def total():
+    if hasattr(sys, 'gettotalrefcount'):
+        return sys.gettotalrefcount()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def check(fun, *args, number=10_000, rounds=5, per_call=1):
+    for _ in range(number):  # warm up caches & free lists
+        fun(*args)
+    refs = [sys.getrefcount(arg) for arg in args]
+
+    tracing = not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    try:
+        gc.collect()
+        samples = [total()]
+        for _ in range(rounds):
+            for _ in range(number):
+                fun(*args)
+            gc.collect()
+            samples.append(total())
+    finally:
+        if tracing:
+            tracemalloc.stop()
+
+    name = getattr(fun, '__name__', fun)
+    after = [sys.getrefcount(arg) for arg in args]
+    if grown := [arg for arg, before, now in zip(args, refs, after) if now - before >= number]:
+        raise Leaking(name, 'references', grown)
+
+    growth = [after - before for before, after in zip(samples, samples[1:])]
+    if all(g > 0 for g in growth) and samples[-1] - samples[0] >= per_call * number * rounds:
+        raise Leaking(name, 'memory', samples)
+
+
+SCALARS = (  # annotation, sample argument
+    ('bool', True),
+    ('chr', b'x'),
+    ('str', 'cexi'),
+    ("'short'", 7),
+    ('int', 10 ** 6),
+    ("'py_size'", 10 ** 12),
+    ('float', 1.5),
+    ("'double'", 2.5),
+    ('complex', 1 + 2j),
+    ("'long'", 10 ** 12),
+    ("'long long'", 10 ** 15),
+    ("'u8'", 200),
+    ("'u16'", 60000),
+    ("'u32'", 4 * 10 ** 9),
+    ("'u64'", 2 ** 63),
+    ("'u128'", 2 ** 64 - 1),
+    ('bytes', b'cexi'),
+    ('bytearray', bytearray(b'cexi')),
+    ('object', [1]),
+)
+
+
+def _source():
+    lines = ['class Leaks(Module):']
+    for i, (annotation, _) in enumerate(SCALARS):
+        lines += [
+            '    @s.py',
+            f'    def identity_{_suffix(i)}(x: {annotation}) -> {annotation}:',
+            '        "return x;"',
+            '    @s.share',
+            f'    def echo_{_suffix(i)}(self, x: {annotation}) -> {annotation}:',
+            '        return x',
+            '    @s.py',  # C -> python -> C through the .share wrapper
+            f'    def relay_{_suffix(i)}(x: {annotation}) -> int:',
+            '        """',
+            f'        {TypeTable.py_to_cee[eval(annotation)]} r;',
+            f'        if (echo_{_suffix(i)}(x, &r))',
+            '            return -1;',
+            *(['        Py_DECREF(r);'] if annotation == 'object' else []),
+            '        return 0;',
+            '        """',
+        ]
+    lines += [
+        '    @s.py',
+        '    def untyped(x):',
+        '        "return x;"',
+        '    @s.py',
+        '    def buffer(x: bin) -> int:',
+        '        "return (int)x.len;"',
+        '    @s.py',
+        "    def doubles(xs: Array('double'), k: int) -> ('double', int):",
+        '        "return(xs_len ? xs[0] : 0.0, k);"',
+        '    @s.py(vectorize=True, nogil=True)',
+        "    def inc(x: 'double') -> 'double':",
+        '        "return x + 1;"',
+        '    @s.py',
+        "    def callbacks(x: 'double', o: object) -> int:",
+        '        """',
+        '        double d; int i; char *c; PyObject *r;',
+        "        if (echo_h(x, &d) || echo_e(1000000, &i) || echo_c(\"cexi\", &c) || echo_s(o, &r))",
+        '            return -1;',
+        '        Py_DECREF(r);',
+        '        return 0;',
+        '        """',
+    ]
+    return '\n'.join(lines)
+
+
+def _suffix(i):
+    return 'abcdefghijklmnopqrstuvwxyz'[i]
+
+
+def module():
+    namespace = {'Module': Module, 's': s, 'Array': Array}
+    exec(_source(), namespace)
+    return namespace['Leaks']()
+
+
+def main(number=10_000):
+    leaks = module()
+    doubles = array('d', [1.0, 2.0, 3.0])
+    cases = [
+        (getattr(leaks, f'{kind}_{_suffix(i)}'), (sample,))
+        for i, (_, sample) in enumerate(SCALARS) for kind in ('identity', 'relay')
+    ] + [
+        (leaks.untyped, ([1],)),
+        (leaks.buffer, (b'cexi',)),
+        (leaks.doubles, (doubles, 10 ** 6)),
+        (leaks.inc_map, (doubles,)),
+        (leaks.inc_map, ([1.0, 2.0],)),
+        (leaks.callbacks, (1.5, [1])),
+    ]
+
+    failed = 0
+    for fun, args in cases:
+        try:
+            check(fun, *args, number=number)
+        except Leaking as e:
+            failed += 1
+            print(f'LEAK {fun.__name__}{args!r}: {e}')
+        else:
+            print(f'ok   {fun.__name__}{args!r}')
+    return failed
+
+
+if __name__ == '__main__':
+    sys.exit(1 if main() else 0)
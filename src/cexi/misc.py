@@ -1,11 +1,12 @@
 from itertools import product
+from functools import partial
+from inspect import signature
 from operator import itemgetter
 from string import ascii_lowercase
 from collections import OrderedDict
 from uuid import uuid4
 
-from .typing import TypeTable
-from . import templates
+from .typing import empty
 
 
 def _generate_names(count, exclude):
@@ -31,13 +32,6 @@ def gensym(prefix='cexi', suffix=''):
     return f'{prefix}{infix}{suffix}'
 
 
-def ensure_tuple(f):
-    def closure(*args, **kwargs):
-        ret = f(*args, **kwargs)
-        return ret if isinstance(ret, tuple) else (ret,)
-    return closure
-
-
 ESCAPE_SEQ_MAP = {
     '\n': '\\n',
 }
@@ -59,6 +53,37 @@ def mapping(d):
     return func
 
 
+def parameters(obj):
+    skip = 0
+    if isinstance(obj, partial):
+        obj, skip = obj.func, len(obj.args)
+    code = getattr(obj, '__code__', None)
+    if code is None:  # not a plain function, let inspect figure it out
+        sig = signature(obj)
+        return OrderedDict(
+            (k, v.annotation) for k, v in list(sig.parameters.items())[skip:]
+        ), sig.return_annotation
+    annotations = obj.__annotations__
+    names = code.co_varnames[skip:code.co_argcount + code.co_kwonlyargcount]
+    return OrderedDict((n, annotations.get(n, empty)) for n in names), annotations.get('return', empty)
+
+
+def keywords(obj):  # => (positional-only count, keyword-only count, {name: default})
+    code = getattr(obj, '__code__', None)
+    if code is None:
+        params = signature(obj).parameters.values()
+        return (
+            sum(p.kind == p.POSITIONAL_ONLY for p in params),
+            sum(p.kind == p.KEYWORD_ONLY for p in params),
+            {p.name: p.default for p in params if p.default is not p.empty},
+        )
+    positional = code.co_varnames[:code.co_argcount]
+    defaults = obj.__defaults__ or ()
+    defaults = dict(zip(positional[len(positional) - len(defaults):], defaults))
+    defaults.update(obj.__kwdefaults__ or {})
+    return code.co_posonlyargcount, code.co_kwonlyargcount, defaults
+
+
 def zip_decl(types, names, delim=', '):
     return delim.join(f'{t} {n}' for t, n in zip(types, names))
 
@@ -76,26 +101,3 @@ def uses(decos):
 
     return outer
 
-
-class Unpack:
-    map = mapping(TypeTable.py_to_cee)
-    format = mapping(TypeTable.py_to_format)
-
-    def __init__(self, **kwargs):
-        self.mapping = OrderedDict(kwargs.items())
-
-    def translate(self, name):
-        types = self.map(self.mapping.values())
-        names = self.mapping.keys()
-        decl = zip_decl(types, names, delim='; ')
-        format = ''.join(self.format(self.mapping.values()))
-        names = ', '.join(f'&{n}' for n in names)
-        return templates.UNPACK.substitute(
-            decl=f'{decl};',
-            name=name,
-            names=names,
-            format=format
-        )
-
-
-to = Unpack
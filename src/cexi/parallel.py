@@ -0,0 +1,59 @@
+from os import cpu_count
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor
+
+
+def extension_of(module):
+    return getattr(module, 'cexi_module', module)
+
+
+def stale(extensions):
+    for ext in extensions:
+        if not ext.module and ext.generate() and ext.is_compilation_required():
+            yield ext
+
+
+def compile_all(extensions, workers=None):
+    unique = {}  # extensions sharing a lock build the same library, the first one's build serves the rest
+    for ext in extensions:
+        unique.setdefault(ext.lockfile() or ext, ext)
+    with ExitStack() as locks:  # taken in a stable order, so processes preparing overlapping sets don't deadlock
+        extensions = [
+            ext for ext in sorted(unique.values(), key=lambda ext: str(ext.lockfile()))
+            if locks.enter_context(ext.compilation())
+        ]
+        _compile_all(extensions, workers)
+
+
+def _compile_all(extensions, workers):
+    pending = [ext for ext in extensions if not ext.pgo]  # those are trained in this process
+
+    if len(pending) > 1 and (workers or cpu_count() or 1) > 1:
+        # staging directories are removed after the pool has finished writing into them
+        with ExitStack() as staged, ProcessPoolExecutor(min(workers or cpu_count(), len(pending))) as pool:
+            jobs = []
+            for ext in pending:
+                dir = staged.enter_context(ext.staged())
+                fun, args = ext.build_job(dir)
+                jobs.append((ext, dir, pool.submit(fun, *args)))
+            for ext, dir, job in jobs:
+                ext.stats.merge(job.result())
+                ext.stats['cache'] = 'miss'
+                ext.publish(dir)
+    else:
+        for ext in pending:
+            ext.compile()
+
+    for ext in extensions:
+        if ext.pgo:
+            ext.compile()
+
+
+def prepare_all(modules, workers=None):
+    extensions = list(dict.fromkeys(extension_of(m) for m in modules))
+    compile_all(list(stale(extensions)), workers)
+
+    for ext in extensions:
+        ext.prepare()
+
+    return extensions
@@ -0,0 +1,86 @@
+import json
+from os import environ, pathsep, replace
+from sys import modules, version
+from pathlib import Path
+from hashlib import blake2b
+from functools import cache
+from sysconfig import get_config_var
+from shutil import rmtree
+
+from .binary import library_filename
+from .parallel import compile_all
+
+
+DIRNAME = '__cexi__'
+MANIFEST = 'manifest.json'
+
+
+def fingerprint(ext):  # unlike revision it leaves out the compiler, production hosts may have none
+    h = blake2b(digest_size=16)
+    h.update(ext._code_without_revision.encode())
+    h.update(repr((ext.flags, get_config_var('SOABI'), version)).encode())
+    return h.hexdigest()
+
+
+def key(origin, variant=None):
+    module, qualname = origin
+    return f'{module}:{qualname}@{variant}' if variant else f'{module}:{qualname}'
+
+
+def locations(origin):
+    dirs = [Path(p) for p in environ.get('CEXI_PREBUILT', '').split(pathsep) if p]
+    parts = origin[0].split('.')
+    for i in range(len(parts), 0, -1):
+        if file := getattr(modules.get('.'.join(parts[:i])), '__file__', None):
+            dirs.append(Path(file).parent / DIRNAME)
+    return list(dict.fromkeys(dirs))
+
+
+@cache
+def manifest(dir):
+    try:
+        return json.loads((dir / MANIFEST).read_text())['modules']
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def find(ext):
+    if ext.origin is None or not ext.origin[0]:
+        return None
+    name = key(ext.origin, ext.variant)
+    for dir in locations(ext.origin):
+        if (entry := manifest(dir).get(name)) and entry['fingerprint'] == fingerprint(ext):
+            if (libfile := dir / entry['library']).exists():
+                return libfile
+    return None
+
+
+def build(extensions, output, workers=None):
+    output = Path(output).absolute()
+    builds, entries = [], {}
+    for ext in extensions:
+        dir = output / '.'.join(ext.origin)
+        for variant in ext.variants() or [ext]:
+            build = ext.for_variant(variant.variant, dir=dir)
+            builds.append(build)
+            entries[key(ext.origin, build.variant)] = build
+
+    compile_all([build for build in builds if build.is_compilation_required()], workers)
+
+    written = manifest(output).copy()
+    for name, build in entries.items():
+        written[name] = {
+            'library': str(Path(build.dir.name) / library_filename(build.libname)),
+            'fingerprint': fingerprint(build),
+        }
+        for path in build.dir.iterdir():  # only libraries are shipped
+            if path.is_dir():
+                rmtree(path, ignore_errors=True)
+            elif path.suffix == '.lock':
+                path.unlink(missing_ok=True)
+
+    temp = output / f'.{MANIFEST}'
+    temp.write_text(json.dumps({'modules': written}, indent=2, sort_keys=True))
+    replace(temp, output / MANIFEST)
+    manifest.cache_clear()
+    return entries
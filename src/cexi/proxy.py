@@ -1,7 +1,6 @@
 from importlib import import_module
 
 from .exceptions import CodeDiverged, NotInitialized
-from .misc import ensure_tuple
 
 
 class Proxy:
@@ -11,13 +10,15 @@ class Proxy:
         self.o = object
 
     def __getattribute__(self, attr):
-        module = object.__getattribute__(self, "_Proxy__module").module
+        extension = object.__getattribute__(self, "_Proxy__module")
+        member_name = object.__getattribute__(self, "_Proxy__object").name
+        if extension.module is None:
+            extension.prepare()
         try:
-            member_name = object.__getattribute__(self, "_Proxy__object").name
-            obj = getattr(module, member_name)
+            obj = getattr(extension.module, member_name)
             return object.__getattribute__(obj, attr)
         except AttributeError:
-            raise CodeDiverged(module_name, member_name, attr) from None
+            raise CodeDiverged(extension.name, member_name, attr) from None
 
     def __call__(self, *args, **kwargs):
         return self.__getattribute__("__call__")(*args, **kwargs)
@@ -36,11 +37,10 @@ class ReverseProxy:
     def __getattribute__(self, attr):
         if attr == "_cexi_capture_callback":
 
-            def closure():
+            def closure(module):
                 obj = object.__getattribute__(self, "_ReverseProxy__object")
                 capture = object.__getattribute__(self, "_ReverseProxy__capture")
-                module = capture.module.module
-                getattr(module, capture.capture)(ensure_tuple(obj))
+                getattr(module, capture.capture)(obj)
             return closure
 
         return object.__getattribute__(self, attr)
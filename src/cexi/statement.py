@@ -1,14 +1,17 @@
+import re
+from hashlib import blake2b
 from functools import cached_property
-from inspect import signature, Signature
 from collections import OrderedDict
 
 from . import proxy
 from . import templates
-from .misc import generate_names, mapping, zip_decl, Unpack, escape
-from .typing import TypeTable, P
+from .exceptions import GILRequired, NotVectorizable
+from .misc import generate_names, mapping, zip_decl, parameters, keywords, escape
+from .typing import TypeTable, Array, P, is_struct
 
 
-empty = Signature.empty
+python_api = re.compile(r'\b_?Py[A-Za-z]*_?\w*\s*\(')
+translations = {}  # fingerprint => translated statement, shared by all extensions
 
 
 class CodeTemplate:
@@ -27,9 +30,26 @@ class CodeBlock(CodeTemplate):
         self.module = module
 
     def translate(self):
-        if self.template:
-            return self.template.substitute(**self.get_context()).strip()
-        return self.obj.strip()
+        if not self.template:
+            return self.obj.strip()
+        if (code := translations.get(self.fingerprint)) is None:
+            code = translations[self.fingerprint] = self.template.substitute(**self.get_context()).strip()
+        return code
+
+    @cached_property
+    def fingerprint(self):
+        h = blake2b(digest_size=16)
+        for part in (type(self).__qualname__, self.module.name, *self.key()):
+            h.update(repr(part).encode())
+            h.update(b'\0')
+        return h.hexdigest()
+
+    def key(self):
+        return (self.body,)
+
+    @property
+    def declaration(self):  # what other translation units need to see
+        return None if self.template else self.obj.strip()
 
     @cached_property
     def body(self):
@@ -42,21 +62,33 @@ class CeeCallable(CodeBlock):
 
     def __init__(self, obj, module):
         super().__init__(obj, module)
-        self.signature = signature(self.obj)
-        self.returns = self.signature.return_annotation
-        if isinstance(self.returns, str):
-            self.returns = (self.returns,)
-        else:
-            try:
-                self.returns = tuple(self.returns)
-            except TypeError:
-                self.returns = (self.returns,)
-
-        self.params = OrderedDict(
-            (k, v.annotation) for k, v in self.signature.parameters.items()
-        )
         self.name = self.obj.__name__
 
+    @cached_property
+    def signature(self):
+        return parameters(self.obj)
+
+    @cached_property
+    def returns(self):
+        returns = self.signature[1]
+        if isinstance(returns, str):
+            return (returns,)
+        try:
+            return tuple(returns)
+        except TypeError:
+            return (returns,)
+
+    @cached_property
+    def params(self):
+        return self.signature[0]
+
+    def key(self):
+        return (self.name, self.body, tuple(self.params.items()), self.returns)
+
+    @property
+    def declaration(self):
+        return templates.CEE_PROTOTYPE.substitute(self.get_context())
+
     def get_context(self):
         names = self.params.keys()
         types = self.map(self.params.values())
@@ -74,49 +106,160 @@ class Unpack(CodeTemplate):
     map = mapping(TypeTable.py_to_cee)
     format = mapping(TypeTable.py_to_format)
 
-    def __init__(self, name, **kwargs):
+    def __init__(self, name, sources, /, **kwargs):  # parameters may be called `name` or `sources` too
         self.name = name
+        self.sources = sources
         self.mapping = OrderedDict(kwargs.items())
 
+    @staticmethod
+    def view(name):
+        return f'__view_{name}'
+
+    @cached_property
+    def buffers(self):
+        return [
+            name for name, type in self.mapping.items()
+            if isinstance(type, Array) or is_struct(type) or TypeTable.py_to_format.get(type) == 'y*'
+        ]
+
+    def fail(self, acquired):
+        if not acquired:
+            return 'return NULL;'
+        release = ' '.join(templates.RELEASE.substitute(view=v) for v in reversed(acquired))
+        return f'{{ {release} return NULL; }}'
+
+    def convert(self, name, type, source, acquired):
+        if is_struct(type) or isinstance(type, Array) and is_struct(type.type):
+            many = isinstance(type, Array)
+            return templates.UNPACK_STRUCT.substitute(
+                source=source,
+                view=self.view(name),
+                type=TypeTable.py_to_cee[type.type if many else type],
+                many=int(many),
+                flags='PyBUF_WRITABLE' if many and type.writable else '0',
+                fail=self.fail(acquired),
+            )
+        if isinstance(type, Array):
+            cee = TypeTable.py_to_cee[type.type]
+            return templates.UNPACK_ARRAY.substitute(
+                name=self.name,
+                param=name,
+                source=source,
+                view=self.view(name),
+                type=cee,
+                kind=TypeTable.cee_to_kind[cee],
+                writable=' | PyBUF_WRITABLE' if type.writable else '',
+                fail=self.fail(acquired),
+            )
+        format = TypeTable.py_to_format[type]
+        if format == 'O':
+            return templates.UNPACK_BORROW.substitute(name=name, source=source)
+        if converter := TypeTable.format_to_converter.get(format):
+            return templates.UNPACK_CONVERT.substitute(
+                converter=converter, source=source, name=name, fail=self.fail(acquired)
+            )
+        if format == 'y*':
+            name = self.view(name)
+        return templates.UNPACK_PARSE.substitute(
+            format=format, source=source, name=name, fail=self.fail(acquired)
+        )
+
+    @cached_property
+    def parameters(self):
+        decl = []
+        for name, type in self.mapping.items():
+            if isinstance(type, Array):
+                cee = TypeTable.py_to_cee[type.type]
+                const = '' if type.writable else 'const '
+                decl.extend((f'{const}{cee} *{name}', f'Py_ssize_t {name}_len'))
+            elif is_struct(type):
+                decl.append(f'const {TypeTable.py_to_cee[type]} *{name}')
+            else:
+                decl.append(f'{self.map((type,))[0]} {name}')
+        return decl
+
+    @cached_property
+    def arguments(self):
+        args = []
+        for name, type in self.mapping.items():
+            view = self.view(name)
+            if isinstance(type, Array) and is_struct(type.type):
+                args.extend((f'{view}.buf', f'{view}.len / sizeof({TypeTable.py_to_cee[type.type]})'))
+            elif isinstance(type, Array):
+                args.extend((f'{view}.buf', f'{view}.shape[0]'))
+            elif is_struct(type):
+                args.append(f'{view}.buf')
+            elif name in self.buffers:
+                args.append(view)
+            else:
+                args.append(name)
+        return args
+
+    @cached_property
+    def release(self):
+        return '\n    '.join(
+            templates.RELEASE.substitute(view=self.view(name)) for name in reversed(self.buffers)
+        )
+
+    def check(self):
+        if len(self.mapping) < 2:
+            return ''
+        return templates.UNPACK_CHECK.substitute(name=self.name, count=len(self.mapping))
+
     def get_context(self):
-        types = self.map(self.mapping.values())
-        names = self.mapping.keys()
-        decl = zip_decl(types, names, delim='; ')
-        format = ''.join(self.format(self.mapping.values()))
-        names = ', '.join(f'&{n}' for n in names)
+        decl = [
+            f'Py_buffer {self.view(name)}' if name in self.buffers else f'{self.map((type,))[0]} {name}'
+            for name, type in self.mapping.items()
+        ]
+        conversions, acquired = [], []
+        for (name, type), source in zip(self.mapping.items(), self.sources):
+            conversions.append(self.convert(name, type, source, acquired))
+            if name in self.buffers:
+                acquired.append(self.view(name))
         return dict(
-            decl=f'{decl};',
-            name=self.name,
-            names=names,
-            format=format
+            decl='; '.join(decl) + ';' if decl else '',
+            check=self.check(),
+            conversions='\n    '.join(conversions),
         )
 
 
+class KeywordUnpack(Unpack):
+    def check(self):  # positional, keyword & default arguments are gathered into __cexi_argv
+        return templates.UNPACK_KEYWORDS.substitute(name=self.name, count=len(self.mapping))
+
+
 class Pack(CodeTemplate):
     template = templates.PACK
 
-    format = mapping(TypeTable.py_to_format)
-
-    def __init__(self, name, **kwargs):
+    def __init__(self, name, /, **kwargs):
         self.name = name
         self.mapping = OrderedDict(kwargs.items())
 
+    @staticmethod
+    def build(type, value):
+        if is_struct(type):
+            return templates.STRUCT_NEW.substitute(
+                capture=StructType.captured(type), value=value, type=TypeTable.py_to_cee[type]
+            )
+        format = TypeTable.py_to_format[type]
+        if builder := TypeTable.format_to_builder.get(format):
+            return f'{builder}({value})'
+        return f'Py_BuildValue("{format}", {value})'
+
     def get_context(self):
-        names = self.mapping.keys()
-        format = ''.join(self.format(self.mapping.values()))
-        names = ', '.join(str(n) for n in names)
-        return dict(
-            name=self.name,
-            names=names,
-            format=format
-        )
+        values = [self.build(type, name) for name, type in self.mapping.items()]
+        if len(values) != 1:
+            values = [f'cexi_tuple({len(values)}, {", ".join(values)})']
+        return dict(name=self.name, value=values[0])
 
 
 class PyCallable(CeeCallable):
-    def __init__(self, *args, doc=None, flags=None, **kwargs):
+    def __init__(self, *args, doc=None, flags=None, nogil=False, vectorize=False, **kwargs):
         super().__init__(*args, **kwargs)
         self.__doc = doc
         self.__flags = flags
+        self.nogil = nogil
+        self.vectorize = vectorize
 
     @cached_property
     def template(self):
@@ -129,56 +272,277 @@ class PyCallable(CeeCallable):
     def doc(self):
         return "NULL" if self.__doc is None else f'"{self.__doc}"'
 
+    @cached_property
+    def keywords(self):
+        return keywords(self.obj)
+
+    @cached_property
+    def defaults(self):
+        return self.keywords[2]
+
     @cached_property
     def flags(self):
-        return "METH_VARARGS"
+        posonly, _, defaults = self.keywords
+        if not self.params:
+            return "METH_NOARGS"
+        elif posonly < len(self.params) or defaults:
+            return "METH_FASTCALL | METH_KEYWORDS"
+        elif len(self.params) == 1:
+            return "METH_O"
+        else:
+            return "METH_FASTCALL"
+
+    @cached_property
+    def arguments(self):
+        return {
+            "METH_NOARGS": "PyObject *module, PyObject *Py_UNUSED(args)",
+            "METH_O": "PyObject *module, PyObject *__cexi_arg",
+            "METH_FASTCALL": "PyObject *module, PyObject *const *__cexi_args, Py_ssize_t __cexi_nargs",
+            "METH_FASTCALL | METH_KEYWORDS":
+                "PyObject *module, PyObject *const *__cexi_args, Py_ssize_t __cexi_nargs, PyObject *__cexi_kwnames",
+        }[self.flags]
+
+    @cached_property
+    def forward(self):  # how a wrapper taking the same arguments passes them on
+        return {
+            "METH_NOARGS": "module, NULL",
+            "METH_O": "module, __cexi_arg",
+            "METH_FASTCALL": "module, __cexi_args, __cexi_nargs",
+            "METH_FASTCALL | METH_KEYWORDS": "module, __cexi_args, __cexi_nargs, __cexi_kwnames",
+        }[self.flags]
+
+    @cached_property
+    def sources(self):
+        if self.flags == "METH_O":
+            return ("__cexi_arg",)
+        args = "__cexi_argv" if self.flags.endswith("METH_KEYWORDS") else "__cexi_args"
+        return tuple(f"{args}[{i}]" for i in range(len(self.params)))
+
+    def unpack(self):
+        if self.flags.endswith("METH_KEYWORDS"):
+            return KeywordUnpack(self.name, self.sources, **self.params)
+        return Unpack(self.name, self.sources, **self.params)
+
+    @cached_property
+    def signature_definition(self):
+        if not self.flags.endswith("METH_KEYWORDS"):
+            return ''
+        posonly, kwonly, defaults = self.keywords
+        return templates.KEYWORDS_SIGNATURE.substitute(
+            name=self.name,
+            keywords=', '.join(f'"{name}"' for name in self.params),
+            required=''.join('0' if name in defaults else '1' for name in self.params),
+            count=len(self.params),
+            positional=len(self.params) - kwonly,
+            posonly=posonly,
+        )
 
     @cached_property
     def table_entry(self):
-        return f'{{"{self.name}", {self.name}, {self.flags}, {self.doc}}}'
+        function = f'__counted_{self.name}' if self.counted else self.name
+        return f'{{"{self.name}", (PyCFunction)(void(*)(void)){function}, {self.flags}, {self.doc}}}'
 
     def proxy(self):
         return proxy.Proxy(self.module, self)
 
+    @property
+    def counted(self):
+        return bool(self.module.counters)
+
+    @property
+    def counter(self):
+        return f'__counter_{self.name}'
+
+    @property
+    def declaration(self):  # counters are gathered into a table by a unit of their own
+        return f'extern cexi_counter {self.counter};' if self.counted else None
+
+    def translate(self):
+        code = super().translate()
+        if not self.counted:
+            return code
+        counted = templates.COUNTED.substitute(
+            definition=templates.COUNTER.substitute(counter=self.counter, name=self.name, kind='py'),
+            name=self.name,
+            counter=self.counter,
+            arguments=self.arguments,
+            forward=self.forward,
+        )
+        return f'{code}\n\n{counted}'
+
+    def key(self):
+        shared = sorted(obj.name for obj in self.module.code if isinstance(obj, Share)) if self.nogil else ()
+        posonly, kwonly, defaults = self.keywords
+        return (*super().key(), self.nogil, shared, posonly, kwonly, sorted(defaults))
+
+    def check_nogil(self):
+        shared = {
+            obj.name for obj in self.module.code if isinstance(obj, Share)
+        }
+        for match in python_api.finditer(self.body):
+            raise GILRequired(self.name, match.group().rstrip('( '))
+        for name in re.findall(r'\b(\w+)\s*\(', self.body):
+            if name in shared:
+                raise GILRequired(self.name, name)
+
+    def call(self, names):
+        template = templates.CALL_NOGIL if self.nogil else templates.CALL
+        return template.substitute(name=self.name, names=names)
+
     def get_context(self):
+        if self.nogil:
+            self.check_nogil()
         if len(self.returns) == 1:
             return self.get_context1()
         else:
             return self.get_context_multi()
 
     def get_context1(self):
-        map = mapping(TypeTable.py_to_cee)
-        unpack = Unpack('args', **self.params)
-        pack = Pack('ret', **{f'__folded_{self.name}_result': self.returns[0]})
+        unpack = self.unpack()
+        pack = Pack('__cexi_ret', **{f'__folded_{self.name}_result': self.returns[0]})
+        names = ', '.join(('module', *unpack.arguments))
         return dict(
             return_type=self.map(self.returns)[0],
             name=self.name,
+            parameters=', '.join(('PyObject *module', *unpack.parameters)),
+            arguments=self.arguments,
+            call=self.call(names),
             unpack=unpack.translate(),
+            release=unpack.release,
             pack=pack.translate(),
             body=self.body,
-            ret='ret'
+            ret='__cexi_ret',
+            signature=self.signature_definition,
         )
 
     def get_context_multi(self):
-        unpack = Unpack('args', **self.params)
-        pack = Pack('args', **self.params)
-        unpack_ctx = unpack.get_context()
-        pack_ctx = pack.get_context()
-        names = self.params.keys()
-        types = self.map(self.params.values())
-        ret = dict(
+        unpack = self.unpack()
+        names = generate_names(len(self.returns), self.params.keys())
+        types = self.map(self.returns)
+        return dict(
             name=self.name,
+            parameters=', '.join(('PyObject *module', *unpack.parameters)),
+            arguments=self.arguments,
+            call=self.call(', '.join(('module', *unpack.arguments))),
             unpack=unpack.translate(),
+            release=unpack.release,
             body=self.body,
-            format=unpack_ctx['format'],
-            names=pack_ctx['names'],
-            decl=', '.join(' '.join(pair) for pair in zip(types, names))
+            pack=Pack('__cexi_ret', **{
+                f'__folded_{self.name}_result.{n}': t for n, t in zip(names, self.returns)
+            }).translate(),
+            decl=zip_decl(types, names, delim='; '),
+            signature=self.signature_definition,
+        )
+
+
+class Vectorized(PyCallable):
+    template = templates.EXT_MAP
+    flags = "METH_FASTCALL"
+
+    def __init__(self, scalar):
+        super().__init__(scalar.obj, scalar.module, nogil=scalar.nogil)
+        self.scalar = scalar
+        self.name = f'{scalar.name}_map'
+
+    def element(self, type):
+        cee = TypeTable.py_to_cee.get(type) if not isinstance(type, Array) else None
+        format = TypeTable.py_to_format.get(type) if cee else None
+        if cee not in TypeTable.cee_to_buffer or format not in TypeTable.format_to_converter:
+            raise NotVectorizable(self.scalar.name, type)
+        return cee, format
+
+    def get_context(self):
+        if not self.params or len(self.returns) != 1:
+            raise NotVectorizable(self.scalar.name)
+        vectors, acquire, names = [], [], ['module']
+        for index, (name, type) in enumerate(self.params.items()):
+            cee, format = self.element(type)
+            vector = f'__in_{name}'
+            vectors.append(vector)
+            acquire.append(templates.MAP_ACQUIRE.substitute(
+                index=index,
+                vector=vector,
+                kind=TypeTable.cee_to_kind[cee],
+                type=cee,
+                converter=TypeTable.format_to_converter[format],
+            ))
+            acquire.append(
+                f'n = {vector}.len;' if not index else
+                templates.MAP_LENGTH.substitute(vector=vector, name=self.name)
+            )
+            names.append(f'(({cee} *){vector}.data)[i]')
+        return_type, _ = self.element(self.returns[0])
+        loop = templates.MAP_LOOP_NOGIL if self.nogil else templates.MAP_LOOP
+        return dict(
+            name=self.name,
+            vectors=f'cexi_vector {" = {0}, ".join(vectors)} = {{0}};',
+            return_type=return_type,
+            count=len(self.params),
+            acquire='\n    '.join(acquire),
+            kind=TypeTable.cee_to_kind[return_type],
+            format=TypeTable.cee_to_buffer[return_type],
+            loop=loop.substitute(scalar=self.scalar.name, names=', '.join(names)),
+            release='\n    '.join(f'cexi_vector_release(&{v});' for v in reversed(vectors)),
+        )
+
+
+class Defaults(CodeBlock):
+    template = templates.DEFAULTS_CAPTURE
+
+    def __init__(self, fun):
+        super().__init__(fun.obj, fun.module)
+        self.fun = fun
+        self.name = fun.name
+        self.function = f'__capture_defaults_{self.name}'
+
+    @property
+    def values(self):  # aligned with parameters, required ones are never read
+        return tuple(self.fun.defaults.get(name) for name in self.fun.params)
+
+    def key(self):
+        return (self.name,)
+
+    declaration = None
+
+    def get_context(self):
+        return dict(name=self.name, function=self.function)
+
+    @property
+    def table_entry(self):
+        return f'{{"{self.function}", (PyCFunction)(void(*)(void)){self.function}, METH_O, NULL}}'
+
+
+class Counters(CodeBlock):
+    template = templates.COUNTERS
+    name = 'cexi_stats'
+
+    def __init__(self, module):
+        super().__init__(None, module)
+
+    @property
+    def counters(self):
+        return [obj.counter for obj in self.module.code if getattr(obj, 'counted', False)]
+
+    def key(self):
+        return tuple(self.counters)
+
+    declaration = None
+
+    def get_context(self):
+        return dict(counters=''.join(f'&{counter}, ' for counter in self.counters))
+
+    @property
+    def table_entry(self):
+        return ',\n'.join(
+            f'{{"{name}", (PyCFunction)(void(*)(void)){name}, METH_NOARGS, NULL}}'
+            for name in ('cexi_stats', 'cexi_stats_reset')
         )
-        return ret
 
 
 class Capture(PyCallable):
     template = templates.CAPTURE
+    flags = "METH_O"
+    counted = False
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -194,6 +558,57 @@ class Capture(PyCallable):
         )
 
 
+class StructType(CodeBlock):
+    template = templates.STRUCT_CAPTURE
+
+    def __init__(self, obj, module):
+        super().__init__(obj, module)
+        self.name = TypeTable.py_to_cee[obj]
+        self.capture = self.captured(obj)
+        self.function = f'__capture_type_{self.name}'
+
+    @staticmethod
+    def captured(type):
+        return f'__cexi_type_{TypeTable.py_to_cee[type]}'
+
+    @cached_property
+    def body(self):
+        return tuple(self.obj._fields.items())
+
+    def key(self):
+        return (self.name, self.body, self._size, bool(self.module.units))
+
+    @property
+    def _size(self):
+        return self.obj._size
+
+    @cached_property
+    def definition(self):
+        checks = [f'sizeof({self.name}) == {self._size}'] + [
+            f'offsetof({self.name}, {field}) == {offset}' for field, (_, offset) in self.body
+        ]
+        return templates.STRUCT_DEFINITION.substitute(
+            name=self.name,
+            fields='\n    '.join(f'{cee} {field};' for field, (cee, _) in self.body),
+            asserts='\n'.join(templates.STRUCT_ASSERT.substitute(check=c, name=self.name) for c in checks),
+        )
+
+    @property
+    def declaration(self):
+        return f'{self.definition}\n\nextern PyObject *{self.capture};'
+
+    def get_context(self):
+        return dict(capture=self.capture, function=self.function)
+
+    def translate(self):
+        code = super().translate()
+        return code if self.module.units else f'{self.definition}\n\n{code}'
+
+    @property
+    def table_entry(self):
+        return f'{{"{self.function}", (PyCFunction)(void(*)(void)){self.function}, METH_O, NULL}}'
+
+
 class Share(CeeCallable):
     prefix = ""
     format = mapping(TypeTable.py_to_format)
@@ -202,31 +617,96 @@ class Share(CeeCallable):
         super().__init__(obj, module)
         self.capture = capture
 
+    template = templates.SHARE
+
+    @property
+    def counted(self):
+        return bool(self.module.counters)
+
+    @property
+    def counter(self):
+        return f'__counter_{self.name}'
+
+    def key(self):
+        return (*super().key(), self.counted)
+
+    def build(self, index, name, type, built):
+        if TypeTable.py_to_format[type] == 'O':
+            return templates.SHARE_BORROW.substitute(index=index, name=name)
+        fail = ' '.join(f'Py_DECREF(__cexi_argv[{i}]);' for i in reversed(built))
+        return templates.SHARE_BUILD.substitute(
+            index=index, value=Pack.build(type, name), fail=f'{{ {fail} return 2; }}'
+        )
+
+    def convert(self, name, type, source):
+        format = TypeTable.py_to_format[type]
+        if format == 'O':
+            return templates.SHARE_RETURN_OBJECT.substitute(name=name, source=source)
+        if converter := TypeTable.format_to_converter.get(format):
+            return templates.SHARE_CONVERT.substitute(
+                converter=converter, source=source, name=name
+            )
+        return templates.SHARE_PARSE.substitute(format=format, source=source, name=name)
+
     @cached_property
-    def template(self):
-        if self.params:
-            return templates.SHARE
-        else:
-            return templates.SHARE_NO_ARGS
+    def borrowed(self):  # outputs pointing into the result (e.g. `char *` of str) are valid till the next call
+        return any(
+            TypeTable.py_to_format[t] not in TypeTable.format_to_converter
+            and TypeTable.py_to_format[t] != 'O'
+            for t in self.returns
+        )
 
-    def get_context(self):
+    @cached_property
+    def decl(self):
         in_types, out_types = self.map(self.params.values()), self.map(self.returns)
         in_names, out_names = self.params.keys(), generate_names(
             len(self.returns), self.params.keys()
         )
         out_types = tuple(P.map(t) for t in out_types)
-        in_format = "".join(self.format(self.params.values()))
-        out_format = "".join(self.format(self.returns))
+        return ', '.join(filter(None, (zip_decl(in_types, in_names), zip_decl(out_types, out_names))))
+
+    @property
+    def declaration(self):
+        prototype = templates.SHARE_PROTOTYPE.substitute(name=self.name, decl=self.decl)
+        return f'{prototype}\nextern cexi_counter {self.counter};' if self.counted else prototype
+
+    def get_context(self):
+        out_names = generate_names(len(self.returns), self.params.keys())
+
+        build = []
+        for index, (name, type) in enumerate(self.params.items(), 1):
+            build.append(self.build(index, name, type, range(1, index)))
+
+        if len(self.returns) == 1:
+            convert = [self.convert(out_names[0], self.returns[0], '__cexi_result')]
+        else:
+            convert = [templates.SHARE_UNPACK.substitute(name=self.name, count=len(self.returns))]
+            convert.extend(
+                self.convert(name, type, f'PyTuple_GET_ITEM(__cexi_result, {i})')
+                for i, (name, type) in enumerate(zip(out_names, self.returns))
+            )
+
         return dict(
             name=self.name,
-            in_decl=zip_decl(in_types, in_names),
-            out_decl=zip_decl(out_types, out_names),
+            decl=self.decl,
             capture=self.capture.captured,
-            in_format=in_format,
-            in_params=", ".join(in_names),
-            out_format=out_format,
-            out_params=", ".join(out_names),
+            argc=len(self.params),
+            build='\n    '.join(build),
+            release='\n    '.join(f'Py_DECREF(__cexi_argv[{i}]);' for i in range(1, len(self.params) + 1)),
+            convert='\n    '.join(convert),
+            last_decl='\n'.join(filter(None, (
+                f'static PyObject *{self.last} = NULL;' if self.borrowed else '',
+                templates.COUNTER.substitute(counter=self.counter, name=self.name, kind='share') if self.counted else '',
+            ))),
+            enter='unsigned long long __cexi_start = cexi_now();\n    ' if self.counted else '',
+            leave=f'cexi_count(&{self.counter}, __cexi_start);\n    ' if self.counted else '',
+            done=templates.SHARE_KEEP.substitute(last=self.last) if self.borrowed else 'Py_DECREF(__cexi_result);',
         )
 
+    @property
+    def last(self):
+        return f'__last_{self.name}_result'
+
+
     def proxy(self):
         return proxy.ReverseProxy(self.module, self.obj, self.capture)
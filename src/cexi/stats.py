@@ -0,0 +1,58 @@
+from time import perf_counter
+from contextlib import contextmanager
+
+
+PHASES = ('codegen', 'lock', 'compile', 'link', 'load', 'capture')
+hooks = []  # called with (extension, stats) whenever an extension gets loaded
+
+
+def add_hook(fun):
+    hooks.append(fun)
+    return fun
+
+
+def remove_hook(fun):
+    hooks.remove(fun)
+
+
+class Stats(dict):  # phase => seconds, plus `cache` (hit/miss/prebuilt) & `size` of the loaded library
+    @contextmanager
+    def timed(self, phase):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self[phase] = self.get(phase, 0.0) + perf_counter() - start
+
+    def merge(self, other):
+        for phase in PHASES:
+            if phase in other:
+                self[phase] = self.get(phase, 0.0) + other[phase]
+        return self
+
+    @property
+    def total(self):
+        return sum(self.get(phase, 0.0) for phase in PHASES)
+
+
+def publish(extension, stats):
+    for hook in hooks:
+        hook(extension, stats)
+
+
+def report(extensions):
+    rows = [('module', 'cache', *PHASES, 'total', 'size')]
+    for ext in extensions:
+        stats = ext.stats
+        rows.append((
+            f'{ext.stem}',
+            stats.get('cache', '-'),
+            *(f'{stats[phase] * 1000:.1f}ms' if phase in stats else '-' for phase in PHASES),
+            f'{stats.total * 1000:.1f}ms',
+            f'{stats["size"] / 1024:.0f}KiB' if 'size' in stats else '-',
+        ))
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return '\n'.join(
+        '  '.join(cell.ljust(width) if not i else cell.rjust(width) for i, (cell, width) in enumerate(zip(row, widths)))
+        for row in rows
+    )
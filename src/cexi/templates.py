@@ -1,8 +1,34 @@
 from string import Template
 
 
+class Compiled(Template):  # placeholders are located once instead of on every substitution
+    def __init__(self, template):
+        super().__init__(template)
+        self.parts, start = [], 0
+        for match in self.pattern.finditer(template):
+            if match.group('invalid') is not None:
+                self.parts = None
+                return
+            self.parts.append((template[start:match.start()], None))
+            if match.group('escaped') is not None:
+                self.parts.append((self.delimiter, None))
+            else:
+                self.parts.append((None, match.group('named') or match.group('braced')))
+            start = match.end()
+        self.parts.append((template[start:], None))
+
+    def substitute(self, mapping={}, /, **kws):
+        if self.parts is None:
+            return super().substitute(mapping, **kws)
+        if mapping and kws:
+            mapping = {**mapping, **kws}
+        elif kws:
+            mapping = kws
+        return ''.join(text if name is None else str(mapping[name]) for text, name in self.parts)
+
+
 def template(text):
-    return Template(text.strip())
+    return Compiled(text.strip())
 
 
 MANDATORY_HEADER = """
@@ -11,21 +37,482 @@ MANDATORY_HEADER = """
 """.strip()
 
 
+CONVERTERS = """
+#include <stdarg.h>
+#include <stddef.h>
+
+static inline PyObject *
+cexi_new_ref(void *o)
+{
+    if (!o && !PyErr_Occurred())
+        PyErr_SetString(PyExc_SystemError, "NULL object returned without exception set");
+    Py_XINCREF((PyObject *)o);
+    return (PyObject *)o;
+}
+
+static PyObject *
+cexi_struct_new(PyObject *type, const void *data, Py_ssize_t size)
+{
+    if (!type) {
+        PyErr_SetString(PyExc_SystemError, "struct type isn't captured");
+        return NULL;
+    }
+    PyObject *memory = PyByteArray_FromStringAndSize(data, size);
+    if (!memory)
+        return NULL;
+    PyObject *ret = PyObject_CallOneArg(type, memory);
+    Py_DECREF(memory);
+    return ret;
+}
+
+static int
+cexi_struct_acquire(PyObject *o, Py_buffer *view, Py_ssize_t size, int many, int flags)
+{
+    PyObject *memory = PyObject_CheckBuffer(o) ? (Py_INCREF(o), o) : PyObject_GetAttrString(o, "_memory");
+    if (!memory)
+        return 0;
+    int failed = PyObject_GetBuffer(memory, view, PyBUF_C_CONTIGUOUS | flags) < 0;
+    Py_DECREF(memory);
+    if (failed)
+        return 0;
+    if (many ? view->len % size : view->len != size) {
+        PyBuffer_Release(view);
+        PyErr_SetString(PyExc_TypeError, "buffer size doesn't match the struct layout");
+        return 0;
+    }
+    return 1;
+}
+
+typedef struct {
+    const char *name;
+    const char *const *keywords;
+    const char *required;  /* '1' per parameter without a default */
+    PyObject **interned;
+    Py_ssize_t count, positional, posonly;
+    PyObject *defaults;  /* tuple aligned with keywords, captured on load */
+} cexi_signature;
+
+static int
+cexi_parse_keywords(cexi_signature *sig, PyObject *const *args, Py_ssize_t nargs, PyObject *kwnames, PyObject **argv)
+{
+    Py_ssize_t i, j, nkw = kwnames ? PyTuple_GET_SIZE(kwnames) : 0;
+    if (nargs > sig->positional) {
+        PyErr_Format(
+            PyExc_TypeError, "%s() takes at most %zd positional arguments (%zd given)",
+            sig->name, sig->positional, nargs
+        );
+        return 0;
+    }
+    for (i = 0; i < sig->count; i++)
+        argv[i] = i < nargs ? args[i] : NULL;
+    if (nkw && !sig->interned[0]) {
+        for (i = sig->count - 1; i >= 0; i--)  /* the first one marks the whole table as ready */
+            if (!(sig->interned[i] = PyUnicode_InternFromString(sig->keywords[i])))
+                return 0;
+    }
+    for (i = 0; i < nkw; i++) {
+        PyObject *key = PyTuple_GET_ITEM(kwnames, i);
+        for (j = sig->posonly; j < sig->count && sig->interned[j] != key; j++);
+        if (j == sig->count)  /* a name the caller didn't intern */
+            for (j = sig->posonly; j < sig->count && PyUnicode_CompareWithASCIIString(key, sig->keywords[j]); j++);
+        if (j == sig->count) {
+            PyErr_Format(PyExc_TypeError, "%s() got an unexpected keyword argument '%U'", sig->name, key);
+            return 0;
+        }
+        if (argv[j]) {
+            PyErr_Format(PyExc_TypeError, "%s() got multiple values for argument '%s'", sig->name, sig->keywords[j]);
+            return 0;
+        }
+        argv[j] = args[nargs + i];
+    }
+    for (i = nargs; i < sig->count; i++) {
+        if (argv[i])
+            continue;
+        if (sig->required[i] == '1' || !sig->defaults) {
+            PyErr_Format(PyExc_TypeError, "%s() missing required argument '%s'", sig->name, sig->keywords[i]);
+            return 0;
+        }
+        argv[i] = PyTuple_GET_ITEM(sig->defaults, i);
+    }
+    return 1;
+}
+
+static PyObject *
+cexi_tuple(Py_ssize_t n, ...)
+{
+    va_list items;
+    PyObject *tuple = PyTuple_New(n);
+    va_start(items, n);
+    for (Py_ssize_t i = 0; i < n; i++) {
+        PyObject *item = va_arg(items, PyObject *);
+        if (tuple && item) {
+            PyTuple_SET_ITEM(tuple, i, item);
+        } else {
+            Py_XDECREF(item);
+            Py_CLEAR(tuple);
+        }
+    }
+    va_end(items);
+    return tuple;
+}
+
+static inline int
+cexi_as_bool(PyObject *o, void *p)
+{
+    int v = PyObject_IsTrue(o);
+    if (v < 0)
+        return 0;
+    *(_Bool *)p = v;
+    return 1;
+}
+
+static inline int
+cexi_as_long(PyObject *o, void *p)
+{
+    long v = PyLong_AsLong(o);
+    if (v == -1 && PyErr_Occurred())
+        return 0;
+    *(long *)p = v;
+    return 1;
+}
+
+static inline int
+cexi_as_int(PyObject *o, void *p)
+{
+    long v = PyLong_AsLong(o);
+    if (v == -1 && PyErr_Occurred())
+        return 0;
+    if (v > INT_MAX || v < INT_MIN) {
+        PyErr_SetString(PyExc_OverflowError, "value does not fit into C int");
+        return 0;
+    }
+    *(int *)p = (int)v;
+    return 1;
+}
+
+static inline int
+cexi_as_short(PyObject *o, void *p)
+{
+    long v = PyLong_AsLong(o);
+    if (v == -1 && PyErr_Occurred())
+        return 0;
+    if (v > SHRT_MAX || v < SHRT_MIN) {
+        PyErr_SetString(PyExc_OverflowError, "value does not fit into C short");
+        return 0;
+    }
+    *(short *)p = (short)v;
+    return 1;
+}
+
+static inline int
+cexi_as_ubyte(PyObject *o, void *p)
+{
+    long v = PyLong_AsLong(o);
+    if (v == -1 && PyErr_Occurred())
+        return 0;
+    if (v > UCHAR_MAX || v < 0) {
+        PyErr_SetString(PyExc_OverflowError, "value does not fit into C unsigned char");
+        return 0;
+    }
+    *(unsigned char *)p = (unsigned char)v;
+    return 1;
+}
+
+static inline int
+cexi_as_ushort(PyObject *o, void *p)
+{
+    long v = PyLong_AsLong(o);
+    if (v == -1 && PyErr_Occurred())
+        return 0;
+    if (v > USHRT_MAX || v < 0) {
+        PyErr_SetString(PyExc_OverflowError, "value does not fit into C unsigned short");
+        return 0;
+    }
+    *(unsigned short *)p = (unsigned short)v;
+    return 1;
+}
+
+static inline int
+cexi_as_ulong(PyObject *o, void *p)
+{
+    unsigned long v = PyLong_AsUnsignedLong(o);
+    if (v == (unsigned long)-1 && PyErr_Occurred())
+        return 0;
+    *(unsigned long *)p = v;
+    return 1;
+}
+
+static inline int
+cexi_as_uint(PyObject *o, void *p)
+{
+    unsigned long v = PyLong_AsUnsignedLong(o);
+    if (v == (unsigned long)-1 && PyErr_Occurred())
+        return 0;
+    if (v > UINT_MAX) {
+        PyErr_SetString(PyExc_OverflowError, "value does not fit into C unsigned int");
+        return 0;
+    }
+    *(unsigned int *)p = (unsigned int)v;
+    return 1;
+}
+
+static inline int
+cexi_as_ulonglong(PyObject *o, void *p)
+{
+    unsigned long long v = PyLong_AsUnsignedLongLong(o);
+    if (v == (unsigned long long)-1 && PyErr_Occurred())
+        return 0;
+    *(unsigned long long *)p = v;
+    return 1;
+}
+
+static inline int
+cexi_as_longlong(PyObject *o, void *p)
+{
+    long long v = PyLong_AsLongLong(o);
+    if (v == -1 && PyErr_Occurred())
+        return 0;
+    *(long long *)p = v;
+    return 1;
+}
+
+static inline int
+cexi_as_py_ssize(PyObject *o, void *p)
+{
+    Py_ssize_t v = PyNumber_AsSsize_t(o, PyExc_OverflowError);
+    if (v == -1 && PyErr_Occurred())
+        return 0;
+    *(Py_ssize_t *)p = v;
+    return 1;
+}
+
+static inline int
+cexi_as_double(PyObject *o, void *p)
+{
+    double v = PyFloat_AsDouble(o);
+    if (v == -1.0 && PyErr_Occurred())
+        return 0;
+    *(double *)p = v;
+    return 1;
+}
+
+static inline int
+cexi_as_float(PyObject *o, void *p)
+{
+    double v = PyFloat_AsDouble(o);
+    if (v == -1.0 && PyErr_Occurred())
+        return 0;
+    *(float *)p = (float)v;
+    return 1;
+}
+
+static inline int
+cexi_buffer_kind_is(const Py_buffer *view, char kind, Py_ssize_t itemsize)
+{
+    const char *format = view->format ? view->format : "B";
+    if (*format == '@' || *format == '=')
+        format++;
+    if (!format[0] || format[1] || view->itemsize != itemsize)
+        return 0;
+    switch (kind) {
+    case 'i': return strchr("bhilqn", format[0]) != NULL;
+    case 'u': return strchr("BHILQN", format[0]) != NULL;
+    case 'f': return strchr("efd", format[0]) != NULL;
+    default: return format[0] == kind;
+    }
+}
+
+typedef struct {
+    Py_buffer view;
+    void *data;
+    Py_ssize_t len;
+    int owned;
+} cexi_vector;
+
+static int
+cexi_vector_acquire(PyObject *o, cexi_vector *v, char kind, Py_ssize_t itemsize,
+                    int (*convert)(PyObject *, void *))
+{
+    if (PyObject_CheckBuffer(o)) {
+        if (PyObject_GetBuffer(o, &v->view, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) < 0)
+            return 0;
+        if (v->view.ndim != 1 || !cexi_buffer_kind_is(&v->view, kind, itemsize)) {
+            PyBuffer_Release(&v->view);
+            PyErr_SetString(PyExc_TypeError, "expected 1-D contiguous buffer of matching type");
+            return 0;
+        }
+        v->data = v->view.buf;
+        v->len = v->view.shape[0];
+        return 1;
+    }
+
+    PyObject *seq = PySequence_Fast(o, "expected buffer or iterable");
+    if (!seq)
+        return 0;
+    Py_ssize_t len = PySequence_Fast_GET_SIZE(seq);
+    PyObject **items = PySequence_Fast_ITEMS(seq);
+    char *data = PyMem_Malloc(len ? len * itemsize : 1);
+    if (!data) {
+        Py_DECREF(seq);
+        PyErr_NoMemory();
+        return 0;
+    }
+    for (Py_ssize_t i = 0; i < len; i++) {
+        if (!convert(items[i], data + i * itemsize)) {
+            PyMem_Free(data);
+            Py_DECREF(seq);
+            return 0;
+        }
+    }
+    Py_DECREF(seq);
+    v->data = data;
+    v->len = len;
+    v->owned = 1;
+    return 1;
+}
+
+static void
+cexi_vector_release(cexi_vector *v)
+{
+    if (v->owned)
+        PyMem_Free(v->data);
+    else if (v->view.obj)
+        PyBuffer_Release(&v->view);
+}
+
+static int
+cexi_vector_output(PyObject *out, Py_buffer *view, PyObject **ret, Py_ssize_t len,
+                   char kind, Py_ssize_t itemsize, const char *format)
+{
+    if (out == Py_None) {
+        PyObject *storage = PyByteArray_FromStringAndSize(NULL, len * itemsize);
+        if (!storage)
+            return 0;
+        PyObject *bytes = PyMemoryView_FromObject(storage);
+        Py_DECREF(storage);
+        if (!bytes)
+            return 0;
+        *ret = PyObject_CallMethod(bytes, "cast", "s", format);
+        Py_DECREF(bytes);
+        if (!*ret)
+            return 0;
+    } else {
+        Py_INCREF(out);
+        *ret = out;
+    }
+    if (PyObject_GetBuffer(*ret, view, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT | PyBUF_WRITABLE) < 0) {
+        Py_CLEAR(*ret);
+        return 0;
+    }
+    if (view->ndim != 1 || view->shape[0] != len || !cexi_buffer_kind_is(view, kind, itemsize)) {
+        PyBuffer_Release(view);
+        Py_CLEAR(*ret);
+        PyErr_SetString(PyExc_ValueError, "output must be writable 1-D contiguous buffer of matching type & length");
+        return 0;
+    }
+    return 1;
+}
+""".strip()
+
+
 ERROR = template("static PyObject* ${error};")
 
 UNPACK = template(
     """
     ${decl}
-    PyArg_ParseTuple(${name}, "${format}", ${names});
+    ${check}
+    ${conversions}
 """
 )
 
-PACK = template(
+UNPACK_CHECK = template(
     """
-    ${name} = Py_BuildValue("${format}", ${names});
+if (__cexi_nargs != ${count}) {
+        PyErr_Format(PyExc_TypeError, "${name}() takes exactly ${count} arguments (%zd given)", __cexi_nargs);
+        return NULL;
+    }
 """
 )
 
+UNPACK_KEYWORDS = template(
+    """
+PyObject *__cexi_argv[${count}];
+    if (!cexi_parse_keywords(&__signature_${name}, __cexi_args, __cexi_nargs, __cexi_kwnames, __cexi_argv))
+        return NULL;
+"""
+)
+
+UNPACK_CONVERT = template(
+    """
+if (!${converter}(${source}, &${name}))
+        ${fail}
+"""
+)
+
+UNPACK_PARSE = template(
+    """
+if (!PyArg_Parse(${source}, "${format}", &${name}))
+        ${fail}
+"""
+)
+
+UNPACK_ARRAY = template(
+    """
+if (PyObject_GetBuffer(${source}, &${view}, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT${writable}) < 0)
+        ${fail}
+    if (${view}.ndim != 1 || !cexi_buffer_kind_is(&${view}, '${kind}', sizeof(${type}))) {
+        PyBuffer_Release(&${view});
+        PyErr_Format(PyExc_TypeError, "${name}() argument '${param}' must be 1-D contiguous buffer of ${type}");
+        ${fail}
+    }
+"""
+)
+
+STRUCT_NEW = template("cexi_struct_new(${capture}, &${value}, sizeof(${type}))")
+
+UNPACK_STRUCT = template(
+    """
+if (!cexi_struct_acquire(${source}, &${view}, sizeof(${type}), ${many}, ${flags}))
+        ${fail}
+"""
+)
+
+RELEASE = template("PyBuffer_Release(&${view});")
+
+UNPACK_BORROW = template("${name} = ${source};")
+
+PACK = template("${name} = ${value};")
+
+STRUCT_DEFINITION = template(
+    """
+typedef struct {
+    ${fields}
+} ${name};
+
+${asserts}
+"""
+)
+
+STRUCT_ASSERT = template(
+    '_Static_assert(${check}, "${name} layout differs from its python view");'
+)
+
+STRUCT_CAPTURE = template(
+    """
+PyObject *${capture} = NULL;
+
+static PyObject *
+${function}(PyObject *module, PyObject *type)
+{
+    Py_XINCREF(type);
+    Py_XSETREF(${capture}, type);
+    Py_RETURN_NONE;
+}
+"""
+)
+
+CEE_PROTOTYPE = template("${return_type} ${name}(${parameters});")
+
 CEE_FUNCTION = template(
     """
 ${return_type}
@@ -36,22 +523,46 @@ ${name}(${parameters})
 """
 )
 
+KEYWORDS_SIGNATURE = template(
+    """
+static const char *const __keywords_${name}[] = {${keywords}};
+static PyObject *__interned_${name}[${count}];
+static cexi_signature __signature_${name} = {
+    "${name}", __keywords_${name}, "${required}", __interned_${name}, ${count}, ${positional}, ${posonly}, NULL
+};
+"""
+)
+
+DEFAULTS_CAPTURE = template(
+    """
+static PyObject *
+${function}(PyObject *module, PyObject *defaults)
+{
+    Py_XINCREF(defaults);
+    Py_XSETREF(__signature_${name}.defaults, defaults);
+    Py_RETURN_NONE;
+}
+"""
+)
+
 EXT_FUNCTION1 = template(
     """
-${return_type}
-__folded_${name}(PyObject *module, PyObject *args)
+${signature}
+static inline ${return_type}
+__folded_${name}(${parameters})
 {
-    ${unpack}
     ${body}
 }
 
 static PyObject *
-${name}(PyObject *module, PyObject *args)
+${name}(${arguments})
 {
-    ${return_type} __folded_${name}_result = __folded_${name}(module, args);
+    ${unpack}
+    ${return_type} __folded_${name}_result;
+    ${call}
+    ${release}
     PyObject * ${ret};
     ${pack}
-    Py_INCREF(${ret});
     return ${ret};
 }
 """)
@@ -59,23 +570,107 @@ ${name}(PyObject *module, PyObject *args)
 
 EXT_FUNCTION_MULTI = template(
     """
-#define return(...) return ${name}_result(__VA_ARGS__)
+${signature}
+struct __folded_${name}_results {
+    ${decl};
+};
 
-static PyObject *
-${name}_result(${decl}) {
-    return Py_BuildValue("${format}", $names);
+#define return(...) return (struct __folded_${name}_results){__VA_ARGS__}
+
+static inline struct __folded_${name}_results
+__folded_${name}(${parameters})
+{
+    ${body}
 }
+#undef return
 
 static PyObject *
-${name}(PyObject *module, PyObject *args)
+${name}(${arguments})
 {
     ${unpack}
-    ${body}
+    struct __folded_${name}_results __folded_${name}_result;
+    ${call}
+    ${release}
+    PyObject * __cexi_ret;
+    ${pack}
+    return __cexi_ret;
 }
-#undef return
 """)
 
 
+EXT_MAP = template(
+    """
+static PyObject *
+${name}(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    ${vectors}
+    Py_buffer __out = {0};
+    PyObject *ret = NULL;
+    Py_ssize_t n;
+    ${return_type} *__result;
+    if (nargs != ${count} && nargs != ${count} + 1) {
+        PyErr_Format(PyExc_TypeError, "${name}() takes ${count} arguments and an optional output (%zd given)", nargs);
+        return NULL;
+    }
+    ${acquire}
+    if (!cexi_vector_output(nargs > ${count} ? args[${count}] : Py_None, &__out, &ret, n,
+                            '${kind}', sizeof(${return_type}), "${format}"))
+        goto exit;
+    __result = __out.buf;
+    ${loop}
+exit:
+    if (__out.obj)
+        PyBuffer_Release(&__out);
+    ${release}
+    return ret;
+}
+"""
+)
+
+MAP_ACQUIRE = template(
+    """
+if (!cexi_vector_acquire(args[${index}], &${vector}, '${kind}', sizeof(${type}), ${converter}))
+        goto exit;
+"""
+)
+
+MAP_LENGTH = template(
+    """
+if (${vector}.len != n) {
+        PyErr_SetString(PyExc_ValueError, "${name}() arguments must be of the same length");
+        goto exit;
+    }
+"""
+)
+
+MAP_LOOP = template(
+    """
+for (Py_ssize_t i = 0; i < n; i++)
+        __result[i] = __folded_${scalar}(${names});
+"""
+)
+
+MAP_LOOP_NOGIL = template(
+    """
+Py_BEGIN_ALLOW_THREADS
+    for (Py_ssize_t i = 0; i < n; i++)
+        __result[i] = __folded_${scalar}(${names});
+    Py_END_ALLOW_THREADS
+"""
+)
+
+
+CALL = template("__folded_${name}_result = __folded_${name}(${names});")
+
+CALL_NOGIL = template(
+    """
+Py_BEGIN_ALLOW_THREADS
+    __folded_${name}_result = __folded_${name}(${names});
+    Py_END_ALLOW_THREADS
+"""
+)
+
+
 METHOD_TABLE = template(
     """
 static PyMethodDef ${name}[] = {
@@ -137,15 +732,13 @@ PyInit_${name}(void)
     };
 
     PyObject * revision = PyLong_FromLong(${revision});
-    Py_XINCREF(revision);
     if (PyModule_AddObject(${name}, "cexi_revision", revision) < 0) {
         Py_XDECREF(revision);
-        Py_CLEAR(revision);
         Py_DECREF(${name});
         return NULL;
     };
 
-    return ${name};
+${units}    return ${name};
 };
 """
 )
@@ -154,17 +747,12 @@ CAPTURE = template(
     """
 ${decl}
 static PyObject*
-${name}(PyObject *__whatever, PyObject *args)
+${name}(PyObject *__whatever, PyObject *temp)
 {
     if (${capture}) {
         Py_INCREF(Py_None);
         return Py_None;
     };
-    PyObject* temp;
-    if (!PyArg_ParseTuple(args, "O:set_callback", &temp)) {
-        PyErr_SetString(PyExc_ImportError, "cannot capture python function");
-        return NULL;
-    }
     if (!PyCallable_Check(temp)) {
         PyErr_SetString(PyExc_TypeError, "parameter must be callable");
         return NULL;
@@ -179,45 +767,155 @@ ${name}(PyObject *__whatever, PyObject *args)
 
 SHARE = template(
     """
+${last_decl}
 int
-${name}(${in_decl}, ${out_decl}) {
+${name}(${decl}) {
     if (!${capture})
         return 1;
-    PyObject *result = NULL;
-    if (!(result = PyObject_CallFunction(${capture}, "${in_format}", ${in_params})))
+    PyObject *__cexi_argv[${argc} + 1];
+    ${build}
+    ${enter}PyObject *__cexi_result = PyObject_Vectorcall(
+        ${capture}, __cexi_argv + 1, ${argc} | PY_VECTORCALL_ARGUMENTS_OFFSET, NULL
+    );
+    ${leave}${release}
+    if (!__cexi_result)
         return 2;
-    if (!PyArg_ParseTuple(result, "${out_format}", ${out_params}))
-        return 3;
+    ${convert}
+    ${done}
     return 0;
 }
 """
 )
 
-SHARE_NO_ARGS = template(
+SHARE_PROTOTYPE = template("int ${name}(${decl});")
+
+SHARE_BUILD = template(
     """
-int
-${name}(${out_decl}) {
-    if (!${capture})
-        return 1;
-    PyObject *result = NULL;
-    if (!(result = PyObject_CallFunction(${capture}, NULL)))
-        return 2;
-    if (!PyArg_ParseTuple(result, "${out_format}", ${out_params}))
+if (!(__cexi_argv[${index}] = ${value}))
+        ${fail}
+"""
+)
+
+SHARE_BORROW = template(
+    """
+__cexi_argv[${index}] = ${name};
+    Py_INCREF(${name});
+"""
+)
+
+SHARE_UNPACK = template(
+    """
+if (!PyTuple_Check(__cexi_result) || PyTuple_GET_SIZE(__cexi_result) != ${count}) {
+        PyErr_SetString(PyExc_TypeError, "${name}() must return a tuple of ${count} values");
+        Py_DECREF(__cexi_result);
         return 3;
-    return 0;
-}
+    }
+"""
+)
+
+SHARE_CONVERT = template(
+    """
+if (!${converter}(${source}, ${name})) {
+        Py_DECREF(__cexi_result);
+        return 3;
+    }
+"""
+)
+
+SHARE_PARSE = template(
+    """
+if (!PyArg_Parse(${source}, "${format}", ${name})) {
+        Py_DECREF(__cexi_result);
+        return 3;
+    }
+"""
+)
+
+SHARE_KEEP = template(
+    """
+PyObject *__previous = ${last};
+    ${last} = __cexi_result;
+    Py_XDECREF(__previous);
+"""
+)
+
+SHARE_RETURN_OBJECT = template(
+    """
+*${name} = ${source};
+    Py_INCREF(*${name});
 """
 )
 
+
 MODULE_CODE = template(
     """
 $header
 
+$converters
+
 $error
 
 $code
 
 
+$method_table
+
+$module_definition
+"""
+)
+
+
+UNIT_HEADER = template(
+    """
+$header
+
+$converters
+
+extern PyObject* ${error};
+
+$declarations
+"""
+)
+
+
+UNIT = template(
+    """
+#include "${header}"
+
+$code
+
+
+static PyMethodDef ${table}[] = {
+    ${methods}{NULL, NULL, 0, NULL}
+};
+
+int
+${adder}(PyObject *module)
+{
+    return PyModule_AddFunctions(module, ${table});
+}
+"""
+)
+
+
+UNIT_ADD = template(
+    """
+if (${adder}(${name}) < 0) {
+        Py_DECREF(${name});
+        return NULL;
+    };
+"""
+)
+
+
+UNIT_MAIN = template(
+    """
+#include "${header}"
+
+PyObject* ${error};
+
+$adders
+
 $method_table
 
 $module_definition
@@ -225,3 +923,103 @@ $module_definition
 $module_init
 """
 )
+
+
+COUNTER_HELPERS = """
+#include <time.h>
+
+#define CEXI_BUCKETS 32
+
+typedef struct {
+    const char *name;
+    const char *kind;
+    unsigned long long calls, nanoseconds;
+    unsigned long long buckets[CEXI_BUCKETS];  /* calls that took [2^i, 2^(i + 1)) ns, the last one is open */
+} cexi_counter;
+
+static inline unsigned long long
+cexi_now(void)
+{
+    struct timespec now;
+    clock_gettime(CLOCK_MONOTONIC, &now);
+    return now.tv_sec * 1000000000ull + now.tv_nsec;
+}
+
+static inline void
+cexi_count(cexi_counter *counter, unsigned long long start)
+{
+    unsigned long long elapsed = cexi_now() - start;
+    int bucket = elapsed ? 63 - __builtin_clzll(elapsed) : 0;
+    counter->calls++;
+    counter->nanoseconds += elapsed;
+    counter->buckets[bucket < CEXI_BUCKETS ? bucket : CEXI_BUCKETS - 1]++;
+}
+"""
+
+COUNTER = template('cexi_counter ${counter} = {"${name}", "${kind}"};')
+
+COUNTED = template(
+    """
+${definition}
+
+static PyObject *
+__counted_${name}(${arguments})
+{
+    unsigned long long start = cexi_now();
+    PyObject *result = ${name}(${forward});
+    cexi_count(&${counter}, start);
+    return result;
+}
+"""
+)
+
+COUNTERS = template(
+    """
+static cexi_counter *cexi_counters[] = {${counters}NULL};
+
+static PyObject *
+cexi_stats(PyObject *module, PyObject *Py_UNUSED(args))
+{
+    PyObject *stats = PyDict_New();
+    for (cexi_counter **c = cexi_counters; stats && *c; c++) {
+        PyObject *histogram = PyTuple_New(CEXI_BUCKETS);
+        for (int i = 0; histogram && i < CEXI_BUCKETS; i++) {
+            PyObject *calls = PyLong_FromUnsignedLongLong((*c)->buckets[i]);
+            if (!calls)
+                Py_CLEAR(histogram);
+            else
+                PyTuple_SET_ITEM(histogram, i, calls);
+        }
+        PyObject *entry = histogram ? Py_BuildValue(
+            "{s:s,s:K,s:d,s:N}", "kind", (*c)->kind, "calls", (*c)->calls,
+            "seconds", (*c)->nanoseconds / 1e9, "histogram", histogram
+        ) : NULL;
+        if (!entry || PyDict_SetItemString(stats, (*c)->name, entry) < 0)
+            Py_CLEAR(stats);
+        Py_XDECREF(entry);
+    }
+    return stats;
+}
+
+static PyObject *
+cexi_stats_reset(PyObject *module, PyObject *Py_UNUSED(args))
+{
+    for (cexi_counter **c = cexi_counters; *c; c++) {
+        (*c)->calls = (*c)->nanoseconds = 0;
+        memset((*c)->buckets, 0, sizeof((*c)->buckets));
+    }
+    Py_RETURN_NONE;
+}
+"""
+)
+
+PROFILE_DUMP = """
+
+extern void __gcov_dump(void);
+
+__attribute__((visibility("default"))) void
+cexi_profile_dump(void)
+{
+    __gcov_dump();
+}
+"""
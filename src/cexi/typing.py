@@ -1,5 +1,6 @@
 from enum import Enum
 from inspect import Signature
+from struct import Struct as Layout, calcsize
 
 
 empty = Signature.empty
@@ -21,6 +22,23 @@ class Literal:
             raise TypeError(f'cannot compare Literal to {type(other)}')
 
 
+class Array:
+    def __init__(self, type, writable=False):
+        self.type = type
+        self.writable = writable
+
+    def __hash__(self):
+        return hash((Array, self.type, self.writable))
+
+    def __eq__(self, other):
+        if isinstance(other, Array):
+            return (self.type, self.writable) == (other.type, other.writable)
+        return False
+
+    def __repr__(self):
+        return f'Array({self.type!r}, writable={self.writable})'
+
+
 class TypeTable:
     table = tuple((  # table of (python, cexi, cee, format) name combinations
 
@@ -63,6 +81,129 @@ class TypeTable:
     py_to_cee = {row[0]: row[2] for row in table}
     py_to_format = {row[0]: row[3] for row in table if row[3]}
 
+    converters = {  # format => (python -> cee converter, cee -> python builder)
+        'p': ('cexi_as_bool',       'PyBool_FromLong'),
+        'h': ('cexi_as_short',      'PyLong_FromLong'),
+        'i': ('cexi_as_int',        'PyLong_FromLong'),
+        'l': ('cexi_as_long',       'PyLong_FromLong'),
+        'L': ('cexi_as_longlong',   'PyLong_FromLongLong'),
+        'n': ('cexi_as_py_ssize',   'PyLong_FromSsize_t'),
+        'f': ('cexi_as_float',      'PyFloat_FromDouble'),
+        'd': ('cexi_as_double',     'PyFloat_FromDouble'),
+        'b': ('cexi_as_ubyte',      'PyLong_FromLong'),
+        'H': ('cexi_as_ushort',     'PyLong_FromLong'),
+        'I': ('cexi_as_uint',       'PyLong_FromUnsignedLong'),
+        'k': ('cexi_as_ulong',      'PyLong_FromUnsignedLong'),
+        'K': ('cexi_as_ulonglong',  'PyLong_FromUnsignedLongLong'),
+        'D': (None,                 'PyComplex_FromCComplex'),
+        'S': (None,                 'cexi_new_ref'),
+        'Y': (None,                 'cexi_new_ref'),
+        'O': (None,                 'cexi_new_ref'),
+    }
+    format_to_converter = {k: v[0] for k, v in converters.items() if v[0]}
+    format_to_builder = {k: v[1] for k, v in converters.items() if v[1]}
+
+    cee_to_buffer = {  # cee => struct module format character of a buffer element
+        '_Bool': '?',
+        'short': 'h', 'int': 'i', 'long': 'l', 'long long': 'q',
+        'ssize_t': 'n', 'Py_ssize_t': 'n',
+        'unsigned char': 'B', 'unsigned short': 'H', 'unsigned int': 'I',
+        'unsigned long': 'L', 'unsigned long long': 'Q', 'size_t': 'N',
+        'float': 'f', 'double': 'd',
+    }
+    buffer_to_kind = {
+        **dict.fromkeys('bhilqn', 'i'),
+        **dict.fromkeys('BHILQN', 'u'),
+        **dict.fromkeys('efd', 'f'),
+        '?': '?',
+    }
+    cee_to_kind = dict(zip(cee_to_buffer, map(buffer_to_kind.get, cee_to_buffer.values())))
+
+
+class StructMeta(type):
+    def __new__(mcls, name, bases, attrs):
+        attrs.setdefault('__slots__', ())
+        cls = super().__new__(mcls, name, bases, attrs)
+        if not bases:
+            return cls
+
+        fields, format, align = {}, '@', 1
+        for field, type in attrs.get('__annotations__', {}).items():
+            cee = TypeTable.py_to_cee.get(type)
+            if cee not in TypeTable.cee_to_buffer:
+                raise TypeError(f'{name}.{field}: unsupported field type {type!r}')
+            code = TypeTable.cee_to_buffer[cee]
+            offset = calcsize(format + code) - calcsize(code)
+            fields[field] = (cee, offset)
+            setattr(cls, field, field_view(Layout(f'@{code}'), offset))
+            format += code
+            align = max(align, calcsize(f'@c{code}') - calcsize(code))
+
+        cls._fields = fields
+        cls._size = -(-calcsize(format) // align) * align  # trailing padding, as arrays of them have
+        TypeTable.py_to_cee[cls] = name
+        return cls
+
+
+def field_view(layout, offset):
+    def get(self):
+        return layout.unpack_from(self._memory, offset)[0]
+
+    def set(self, value):
+        layout.pack_into(self._memory, offset, value)
+
+    return property(get, set)
+
+
+class Struct(metaclass=StructMeta):  # fields are read from & written to the underlying memory directly
+    __slots__ = ('_memory',)
+
+    def __init__(self, memory=None, /, **values):
+        memory = memoryview(bytearray(self._size) if memory is None else memory).cast('B')
+        if memory.nbytes != self._size:
+            raise ValueError(f'{type(self).__name__} takes {self._size} bytes, got {memory.nbytes}')
+        self._memory = memory
+        for name, value in values.items():
+            setattr(self, name, value)
+
+    @classmethod
+    def array(cls, items):
+        return Records(cls, bytearray(items * cls._size) if isinstance(items, int) else items)
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self._fields)
+        return f'{type(self).__name__}({fields})'
+
+
+class Records:
+    __slots__ = ('type', '_memory')
+
+    def __init__(self, type, memory):
+        memory = memoryview(memory).cast('B')
+        if memory.nbytes % type._size:
+            raise ValueError(f'{memory.nbytes} bytes is not a whole number of {type.__name__}')
+        self.type = type
+        self._memory = memory
+
+    def __len__(self):
+        return self._memory.nbytes // self.type._size
+
+    def __getitem__(self, index):
+        count = len(self)
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError('record index out of range')
+        size = self.type._size
+        return self.type(self._memory[index * size:(index + 1) * size])
+
+    def __repr__(self):
+        return f'<{len(self)} {self.type.__name__} records>'
+
+
+def is_struct(type):
+    return isinstance(type, StructMeta) and type is not Struct
+
 
 class ArgsFlag(Enum):
     pass
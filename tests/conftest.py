@@ -0,0 +1,9 @@
+import pytest
+
+
+@pytest.fixture(scope='session', autouse=True)
+def cache_dir(tmp_path_factory):  # keep builds out of the machine-wide ~/.cache/cexi
+    with pytest.MonkeyPatch.context() as patch:
+        directory = tmp_path_factory.mktemp('cexi-cache')
+        patch.setenv('CEXI_CACHE_DIR', str(directory))
+        yield directory
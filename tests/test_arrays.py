@@ -0,0 +1,78 @@
+from array import array
+
+import pytest
+
+from cexi import Module, Array, s
+
+
+def define():
+    class Kernels(Module):
+
+        @s.py
+        def scale(xs: Array('double', writable=True), k: 'double', /) -> 'double':
+            """
+            double total = 0;
+            for (Py_ssize_t i = 0; i < xs_len; i++)
+                total += (xs[i] *= k);
+            return total;
+            """
+
+        @s.py
+        def total(xs: Array('double'), /) -> 'double':
+            """
+            double total = 0;
+            for (Py_ssize_t i = 0; i < xs_len; i++)
+                total += xs[i];
+            return total;
+            """
+
+        @s.py
+        def count(xs: Array('long long'), /) -> int:
+            """
+            return (int)xs_len;
+            """
+    return Kernels
+
+
+@pytest.fixture(scope='module')
+def kernels():
+    return define()()
+
+
+def test_read_only_arrays(kernels):
+    assert kernels.total(array('d', [1.0, 2.5])) == 3.5
+    assert kernels.total(memoryview(array('d', [1.0, 2.5])).toreadonly()) == 3.5
+    assert kernels.count(array('q', [1, 2, 3])) == 3
+
+
+def test_writable_arrays_are_modified_in_place(kernels):
+    xs = array('d', [1.0, 2.0, 3.0])
+    assert kernels.scale(xs, 2.0) == 12.0
+    assert xs.tolist() == [2.0, 4.0, 6.0]
+
+
+@pytest.mark.parametrize('fun, xs', [
+    ('total', array('f', [1.0])),  # format
+    ('count', array('i', [1])),  # itemsize
+    ('total', memoryview(array('d', [1.0] * 4)).cast('B').cast('d', (2, 2))),  # dimensions
+])
+def test_mismatching_buffers(kernels, fun, xs):
+    with pytest.raises(TypeError, match='must be 1-D contiguous buffer of'):
+        getattr(kernels, fun)(xs)
+
+
+def test_read_only_buffer_passed_as_writable(kernels):
+    with pytest.raises(BufferError):
+        kernels.scale(memoryview(array('d', [1.0])).toreadonly(), 2.0)
+    with pytest.raises(BufferError):
+        kernels.scale(bytes(8), 2.0)
+
+
+def test_views_are_released(kernels):
+    xs = array('d', [1.0])
+    kernels.scale(xs, 2.0)
+    kernels.total(xs)
+    with pytest.raises(TypeError):
+        kernels.scale(xs, 'two')  # fails after the buffer is acquired
+    xs.append(3.0)  # raises BufferError while any view is exported
+    assert xs.tolist() == [2.0, 3.0]
@@ -0,0 +1,117 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+from cexi import Module, s
+from cexi.exceptions import CompileError
+from cexi.parallel import compile_all
+
+
+COLD = '''
+from cexi import Module, s
+
+
+class Cold(Module):
+    directory = {directory!r}
+
+{functions}
+
+print(Cold().f0(1) + Cold().f{last}(1))
+'''
+
+FUNCTION = '''
+    @s.py
+    def f{i}(x: int, /) -> int:
+        """
+        return x + {i};
+        """
+'''
+
+
+def test_processes_starting_at_once_compile_once(tmp_path):
+    processes, functions = 16, 50
+    script = tmp_path / 'cold.py'
+    script.write_text(COLD.format(
+        directory=str(tmp_path / 'build'), last=functions - 1,
+        functions=''.join(FUNCTION.format(i=i) for i in range(functions)),
+    ))
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(sys.path)}
+    workers = [
+        subprocess.Popen([sys.executable, str(script)], stdout=subprocess.PIPE, text=True, env=env)
+        for _ in range(processes)
+    ]
+    outputs = [worker.communicate()[0].strip() for worker in workers]
+
+    assert [worker.returncode for worker in workers] == [0] * processes
+    assert outputs == [str(2 + functions - 1)] * processes
+    assert len(list((tmp_path / 'build').glob('libCold.*.so'))) == 1
+    assert not leftovers(tmp_path)
+
+
+NAMESAKES = '''
+from cexi import Module, s, prepare_all
+
+
+def define(n, path=None):
+    class Foo(Module):
+        directory = path
+
+        @s.py
+        def f(x: int, /) -> int:
+            pass
+        f.__doc__ = f'return x + {{n}};'
+    return Foo
+
+
+cached, persistent = [define(1), define(2)], [define(3, {directory!r}), define(4, {directory!r})]
+prepare_all([*cached, *persistent], workers=2)
+print(*(foo.f(1) for foo in [*cached, *persistent]))
+'''
+
+
+def test_modules_sharing_a_name_build_side_by_side(tmp_path):
+    # each of them locks its build, a lock taken twice by one process would hang
+    script = tmp_path / 'namesakes.py'
+    script.write_text(NAMESAKES.format(directory=str(tmp_path / 'build')))
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(sys.path)}
+    result = subprocess.run([sys.executable, str(script)], capture_output=True, text=True, env=env, timeout=60)
+    assert result.stdout.split() == ['2', '3', '4', '5']
+
+
+def broken(path=None):
+    class Bad(Module):
+        directory = str(path) if path else None
+
+        @s.py
+        def f(x: int, /) -> int:
+            """
+            return undeclared;
+            """
+    return Bad
+
+
+def leftovers(root):
+    return [p.name for p in root.rglob('*') if 'staging' in p.name]
+
+
+def test_failed_persistent_build_leaves_no_staging(tmp_path):
+    with pytest.raises(CompileError):
+        broken(tmp_path)()
+    assert not leftovers(tmp_path)
+
+
+def test_failed_cached_build_leaves_no_staging(tmp_path, monkeypatch):
+    monkeypatch.setenv('CEXI_CACHE_DIR', str(tmp_path))
+    with pytest.raises(CompileError):
+        broken()()
+    assert not leftovers(tmp_path)
+
+
+def test_failed_parallel_builds_leave_no_staging(tmp_path, monkeypatch):
+    monkeypatch.setenv('CEXI_CACHE_DIR', str(tmp_path / 'cache'))
+    modules = [broken(tmp_path / 'persistent'), broken(), broken(tmp_path / 'other')]
+    with pytest.raises(CompileError):
+        compile_all([module.cexi_module for module in modules], workers=2)
+    assert not leftovers(tmp_path)
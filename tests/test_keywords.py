@@ -0,0 +1,68 @@
+import re
+
+import pytest
+
+from cexi import Module, s
+
+
+def define():  # at runtime, so it's built into the test suite's cache
+    class Keywords(Module):
+
+        class options:
+            variants = {'plain': [], 'fast': ['-O3']}
+
+        @s.py
+        def mixed(a: int, /, b: int, c: int = 3, *, d: int, e: int = 5) -> int:
+            """
+            return a + 10 * b + 100 * c + 1000 * d + 10000 * e;
+            """
+
+        @s.py
+        def greet(name: str = 'cexi', *, loud: bool = False) -> str:
+            """
+            return loud ? "HELLO" : name;
+            """
+    return Keywords
+
+
+@pytest.fixture(scope='module')
+def keywords():
+    return define()()
+
+
+def test_positional_and_keyword_arguments(keywords):
+    assert keywords.mixed(1, 2, 4, d=6, e=7) == 76421
+    assert keywords.mixed(1, b=2, c=4, d=6) == 56421
+    assert keywords.mixed(1, d=6, b=2) == 56321
+
+
+def test_defaults(keywords):
+    assert keywords.mixed(1, 2, d=6) == 56321
+    assert keywords.greet() == 'cexi'
+    assert keywords.greet('you') == 'you'
+    assert keywords.greet(loud=True) == 'HELLO'
+
+
+@pytest.mark.parametrize('args, kwargs, message', [
+    ((), {'a': 1, 'b': 2, 'd': 6}, "unexpected keyword argument 'a'"),  # positional-only by keyword
+    ((1, 2), {'b': 2, 'd': 6}, "multiple values for argument 'b'"),
+    ((1, 2), {}, "missing required argument 'd'"),
+    ((1,), {'d': 6}, "missing required argument 'b'"),
+    ((1, 2, 3, 4), {'d': 6}, 'at most 3 positional arguments (4 given)'),
+    ((1, 2), {'d': 6, 'f': 7}, "unexpected keyword argument 'f'"),
+])
+def test_errors(keywords, args, kwargs, message):
+    with pytest.raises(TypeError, match=f'^mixed\\(\\) .*{re.escape(message)}'):
+        keywords.mixed(*args, **kwargs)
+
+
+def test_keywords_from_non_interned_strings(keywords):
+    assert keywords.greet(**{''.join(['lo', 'ud']): True}) == 'HELLO'
+
+
+@pytest.mark.parametrize('name', ['plain', 'fast'])
+def test_variants_capture_defaults(keywords, tmp_path, name):
+    variant = type(keywords).cexi_module.for_variant(name, dir=tmp_path)
+    variant.prepare()
+    assert variant.module.mixed(1, 2, d=6) == 56321
+    assert variant.module.greet() == 'cexi'
@@ -0,0 +1,5 @@
+from cexi import leaks
+
+
+def test_generated_wrappers_do_not_leak():
+    assert leaks.main() == 0  # failing cases are printed, pytest shows them along with the failure
@@ -0,0 +1,55 @@
+import pytest
+
+from cexi import Module, s
+
+
+def define(signature, body):
+    namespace = {'Module': Module, 's': s}
+    exec('\n'.join([
+        'class Names(Module):',
+        '    @s.py',
+        f'    def f{signature}:',
+        f'        "{body}"',
+    ]), namespace)
+    return namespace['Names']
+
+
+# parameters named like the wrapper's own arguments & locals
+@pytest.mark.parametrize('signature, body, args, expected', [
+    ('(ret: int) -> int', 'return ret + 1;', (1,), 2),
+    ('(arg: int, /) -> int', 'return arg + 1;', (1,), 2),
+    ('(arg: int) -> int', 'return arg + 1;', (1,), 2),
+    ('(args: int, nargs: int, /) -> int', 'return args + nargs;', (1, 2), 3),
+    ('(nargs: int, y: int, /) -> int', 'return nargs + y;', (1, 2), 3),
+    ('(name: int, sources: int, /) -> int', 'return name + sources;', (1, 2), 3),
+    ('(argv: int, kwnames: int = 1) -> int', 'return argv + kwnames;', (1,), 2),
+    ('(ret: int, /) -> (int, int)', 'return(ret, ret + 1);', (1,), (1, 2)),
+])
+def test_parameter_names(signature, body, args, expected):
+    assert define(signature, body)().f(*args) == expected
+
+
+
+def callbacks(counted=False):
+    class Callbacks(Module):
+        class options:
+            counters = counted
+
+        @s.share
+        def echo(self, argv: int, result: int, start: int) -> int:
+            return argv + result + start
+
+        @s.py
+        def call(x: int, /) -> int:
+            """
+            int r;
+            if (echo(x, x, x, &r))
+                return -1;
+            return r;
+            """
+    return Callbacks
+
+
+@pytest.mark.parametrize('counted', [False, True])
+def test_share_parameter_names(counted):
+    assert callbacks(counted)().call(1) == 3
@@ -0,0 +1,23 @@
+from cexi import Module, s
+
+
+def define(path):
+    class Headers(Module):
+        directory = str(path)
+
+        @s.py
+        def f(x: int, /) -> int:
+            """
+            return x + 1;
+            """
+    return Headers
+
+
+def test_persistent_modules_keep_precompiled_headers_in_the_cache(tmp_path, cache_dir):
+    Headers = define(tmp_path)
+    Headers()
+    assert Headers.f(1) == 2
+    assert [p.name for p in tmp_path.iterdir() if not p.name.startswith('.')] == [
+        f'libHeaders.{Headers.cexi_module.get_revision()}.so'
+    ]
+    assert list((cache_dir / '.headers').rglob('*.gch'))
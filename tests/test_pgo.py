@@ -0,0 +1,70 @@
+import os
+import sys
+import subprocess
+
+from cexi import Module, s
+
+
+def define(path, train):
+    class Trained(Module):
+        directory = str(path)
+
+        class options:
+            pgo = train
+
+        @s.py
+        def f(x: int, /) -> int:
+            """
+            return x > 500 ? x * 2 : x + 1;
+            """
+    return Trained
+
+
+def test_training_happens_once_per_revision(tmp_path):
+    calls = []
+
+    def train(module):
+        calls.append(module)
+        for i in range(1000):
+            module.f(i)
+
+    Trained = define(tmp_path, train)
+    Trained()
+    assert Trained.f(600) == 1200
+    assert len(calls) == 1
+    assert any(Trained.cexi_module.profiles().rglob('*.gcda'))
+
+    Trained.cexi_module.compile()
+    assert len(calls) == 1
+
+
+TRAINED = '''
+from cexi import Module, s
+
+
+def train(module):
+    for i in range(1000):
+        module.f(i)
+
+
+class Trained(Module):
+    directory = {directory!r}
+
+    class options:
+        pgo = train
+
+    @s.py
+    def f(x: int, /) -> int:
+        """
+        return x > 500 ? x * 2 : x + 1;
+        """
+'''
+
+
+def test_profile_is_reused_through_a_launcher(tmp_path):
+    (tmp_path / 'trained.py').write_text(TRAINED.format(directory=str(tmp_path / 'build')))
+    # any launcher sends compilation through temporary objects, the final build fails on -Werror=missing-profile
+    # unless a later process finds the profile under the same name
+    env = {**os.environ, 'CEXI_LAUNCHER': 'env', 'PYTHONPATH': os.pathsep.join(map(str, [tmp_path, *sys.path]))}
+    for script in ('trained.Trained()', 'trained.Trained.cexi_module.compile()'):
+        subprocess.run([sys.executable, '-c', f'import trained; {script}'], env=env, check=True)
@@ -0,0 +1,84 @@
+import sys
+import importlib
+
+import pytest
+
+from cexi import Module, s
+
+
+SOURCE = '''
+from cexi import Module, s
+
+
+class Foo(Module):
+    class options:
+        reload = {reload}
+
+    @s.py
+    def {name}(x: int, /) -> int:
+        "return x + {n};"
+'''
+
+
+@pytest.fixture
+def directory(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, 'hot', raising=False)
+    yield tmp_path
+    sys.modules.pop('hot', None)
+
+
+def make(n):
+    class Foo(Module):
+        class options:
+            reload = True
+
+        @s.py
+        def f(x: int, /) -> int:
+            pass
+        f.__doc__ = f'return x + {n};'
+    return Foo
+
+
+def define(path, name='f', n=1, reload=True):
+    (path / 'hot.py').write_text(SOURCE.format(name=name, n=n, reload=reload))
+    importlib.invalidate_caches()
+
+
+def test_same_qualname_classes_are_independent():
+    first = make(1)
+    first()
+    second = make(2)
+    second()
+    assert first.f(10) == 11
+    assert second.f(10) == 12
+
+
+def test_reloaded_module_swaps_old_definitions(directory):
+    define(directory, n=1)
+    hot = importlib.import_module('hot')
+    old = hot.Foo
+    old()
+    assert old.f(1) == 2
+
+    define(directory, n=2)
+    importlib.reload(hot).Foo()
+    assert hot.Foo.f(1) == 3
+    assert old.f(1) == 3
+
+    define(directory, name='g', n=3)
+    importlib.reload(hot).Foo()
+    assert hot.Foo.g(1) == 4
+    assert old.f(1) == 3  # the new revision has no `f`, so old definitions keep theirs
+
+
+def test_reload_is_opt_in(directory):
+    define(directory, n=1, reload=False)
+    hot = importlib.import_module('hot')
+    old = hot.Foo
+    old()
+
+    define(directory, n=2, reload=False)
+    importlib.reload(hot).Foo()
+    assert hot.Foo.f(1) == 3
+    assert old.f(1) == 2
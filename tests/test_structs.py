@@ -0,0 +1,95 @@
+import pytest
+
+from cexi import Module, Array, Struct, s
+
+
+class Point(Struct):
+    x: 'double'
+    y: 'double'
+    hit: bool
+
+
+class Padded(Struct):
+    flag: bool
+    value: 'double'
+    tag: 'short'
+
+
+def define():
+    class Geo(Module):
+
+        @s.py
+        def shift(p: Point, dx: 'double', /) -> Point:
+            """
+            Point q = *p;
+            q.x += dx;
+            return q;
+            """
+
+        @s.py
+        def mark(ps: Array(Point, writable=True), r: 'double', /) -> int:
+            """
+            int hits = 0;
+            for (Py_ssize_t i = 0; i < ps_len; i++)
+                hits += ps[i].hit = ps[i].x * ps[i].x + ps[i].y * ps[i].y < r * r;
+            return hits;
+            """
+
+        @s.py
+        def total(ps: Array(Point), /) -> 'double':
+            """
+            double total = 0;
+            for (Py_ssize_t i = 0; i < ps_len; i++)
+                total += ps[i].x + ps[i].y;
+            return total;
+            """
+
+        @s.py
+        def padded(p: Padded, /) -> 'double':
+            """
+            return p->flag + p->value + p->tag;
+            """
+    return Geo
+
+
+@pytest.fixture(scope='module')
+def geo():
+    return define()()
+
+
+def test_layout_matches_the_compiler(geo):  # _Static_asserts in the generated code check it too
+    assert Padded._fields == {'flag': ('_Bool', 0), 'value': ('double', 8), 'tag': ('short', 16)}
+    assert Padded._size == 24
+    assert geo.padded(Padded(flag=True, value=1.5, tag=-3)) == -0.5
+
+
+def test_struct_round_trip(geo):
+    p = Point(x=1.0, y=2.0, hit=True)
+    q = geo.shift(p, 0.5)
+    assert isinstance(q, Point)
+    assert (q.x, q.y, q.hit) == (1.5, 2.0, True)
+    assert p.x == 1.0
+
+
+def test_records_are_mutated_in_place(geo):
+    points = Point.array(3)
+    points[0].x, points[1].x, points[2].y = 0.5, 2.0, -0.25
+    assert geo.mark(points, 1.0) == 2
+    assert [p.hit for p in points] == [True, False, True]
+    assert geo.total(points) == 2.25
+
+
+def test_wrong_sized_buffers(geo):
+    with pytest.raises(TypeError, match="buffer size doesn't match the struct layout"):
+        geo.shift(bytearray(Point._size - 1), 1.0)
+    with pytest.raises(TypeError, match="buffer size doesn't match the struct layout"):
+        geo.mark(bytearray(Point._size + 1), 1.0)
+    with pytest.raises(ValueError):
+        Point(bytearray(Point._size + 1))
+
+
+def test_read_only_records_are_not_writable(geo):
+    points = Point.array(bytes(2 * Point._size))
+    assert geo.total(points) == 0.0
+    with pytest.raises(BufferError):
+        geo.mark(points, 1.0)
@@ -0,0 +1,64 @@
+from array import array
+
+import pytest
+
+from cexi import Module, Struct, s
+
+
+class Sample(Struct):
+    x: 'double'
+    n: int
+
+
+def define(path, parts, k):
+    class Split(Module):
+        directory = str(path)
+
+        class options:
+            units = parts
+
+        @s.share
+        def twice(self, x: int) -> int:
+            return 2 * x
+
+        @s.py
+        def call(x: int, /) -> int:
+            """
+            int r;
+            if (twice(x, &r))
+                return -1;
+            return r;
+            """
+
+        @s.py
+        def weigh(p: Sample, /) -> 'double':
+            """
+            return p->x * p->n;
+            """
+
+        @s.py(vectorize=True)
+        def inc(x: 'double') -> 'double':
+            pass
+        inc.__doc__ = f'return x + {k};'
+    return Split
+
+
+def objects(path):
+    return set((path / 'Split.objects').glob('*.o'))
+
+
+@pytest.mark.parametrize('parts', [True, 3])
+def test_split_modules_recompile_edited_units_only(tmp_path, parts):
+    split = define(tmp_path, parts, 1)()
+    assert split.call(21) == 42
+    assert split.weigh(Sample(x=1.5, n=4)) == 6.0
+    assert split.inc_map(array('d', [1.0, 2.0])).tolist() == [2.0, 3.0]
+    before = objects(tmp_path)
+
+    split = define(tmp_path, parts, 2)()
+    assert split.inc_map(array('d', [1.0, 2.0])).tolist() == [3.0, 4.0]
+    assert split.call(21) == 42
+    after = objects(tmp_path)
+    assert len(after) > 2
+    # the edited function's unit & the module's init, which carries the revision, the rest are reused
+    assert len(after - before) == 2